@@ -0,0 +1,181 @@
+from solver_core import RosterModel, horizon_layout, week_days, BACKENDS, SOLVE_MODES
+from instance_generator import generate_instance
+from instance_loader import load_data
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import resource
+import time
+
+#Compare solver backends on the same weekly model and benchmark the weekly
+#solve across a grid of generated instance sizes, with and without symmetry breaking
+
+GRID_STAFF = [9, 50, 200, 1000]
+GRID_WEEKS = [1, 2, 4, 8]
+
+
+def compare_backends(scheduling_data, backends=BACKENDS, mode="elastic", num_threads=None):
+    weeks = sorted({day["week"] for day in scheduling_data["periods"]})
+    records = []
+    for backend in backends:
+        for current_week in weeks:
+            days = week_days(scheduling_data, current_week)
+
+            start = time.perf_counter()
+            model = RosterModel(scheduling_data["staffs"], scheduling_data["shifts"],
+                                horizon_layout(days), backend, num_threads)
+            build_time = time.perf_counter() - start
+
+            result = model.solve(days, mode=mode)
+            records.append({
+                "backend": backend,
+                "week": current_week,
+                "mode": mode,
+                "build_time": build_time,
+                "solve_time": result.info["solve_time"],
+                "objective": model.solver.Objective().Value() if result[0] is not None else None,
+            })
+    return records
+
+
+def print_summary(records):
+    print(f'{"backend":<8} {"weeks":>5} {"build (s)":>10} {"solve (s)":>10} {"objective":>10}')
+    for backend in dict.fromkeys(record["backend"] for record in records):
+        rows = [record for record in records if record["backend"] == backend]
+        objective = sum(record["objective"] or 0 for record in rows)
+        print(f'{backend:<8} {len(rows):>5} {sum(r["build_time"] for r in rows):>10.3f} '
+              f'{sum(r["solve_time"] for r in rows):>10.3f} {objective:>10.1f}')
+
+
+def run_case(staff_num, week_num, backend="SCIP", mode="elastic", seed=0, time_limit=None,
+             symmetry=False):
+    #One grid cell: all weeks of a generated instance on one compiled model.
+    #Runs in its own process so ru_maxrss is the peak memory of this case only.
+    scheduling_data = generate_instance(staff_num=staff_num, week_num=week_num, seed=seed)
+    days = week_days(scheduling_data, 1)
+
+    start = time.perf_counter()
+    model = RosterModel(scheduling_data["staffs"], scheduling_data["shifts"],
+                        horizon_layout(days), backend, symmetry=symmetry)
+    build_time = time.perf_counter() - start
+
+    solve_time = 0.0
+    objective = 0.0
+    solved = 0
+    for current_week in range(1, week_num + 1):
+        result = model.solve(week_days(scheduling_data, current_week), mode=mode,
+                             time_limit=time_limit)
+        solve_time += result.info["solve_time"]
+        if result[0] is not None:
+            solved += 1
+            objective += model.solver.Objective().Value()
+
+    return {
+        "staff": staff_num,
+        "weeks": week_num,
+        "backend": backend,
+        "mode": mode,
+        "seed": seed,
+        "time_limit": time_limit,
+        "symmetry": symmetry,
+        "build_time": build_time,
+        "solve_time": solve_time,
+        "objective": objective,
+        "solved_weeks": solved,
+        "peak_memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_grid(staff_sizes=GRID_STAFF, week_counts=GRID_WEEKS, backends=("SCIP",), mode="elastic",
+             seed=0, output=None, time_limit=None, symmetries=(False,)):
+    records = []
+    for backend in backends:
+        for staff_num in staff_sizes:
+            for week_num in week_counts:
+                for symmetry in symmetries:
+                    #Fresh worker per case, one at a time so timings are not contended
+                    with ProcessPoolExecutor(max_workers=1) as executor:
+                        record = executor.submit(run_case, staff_num, week_num, backend, mode, seed,
+                                                 time_limit, symmetry).result()
+                    records.append(record)
+                    print(f'{backend:<8} staff={staff_num:<5} weeks={week_num:<2} '
+                          f'symmetry={"on" if symmetry else "off":<3} '
+                          f'build={record["build_time"]:.3f}s solve={record["solve_time"]:.3f}s '
+                          f'objective={record["objective"]:.1f} peak={record["peak_memory_mb"]:.0f}MB')
+                    if output:
+                        with open(output, "a") as f:
+                            f.write(json.dumps(record) + "\n")
+    return records
+
+
+def load_records(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare_records(records, baseline):
+    #Ratio current / baseline per grid cell, < 1 is an improvement
+    key = lambda record: (record["backend"], record["mode"], record["staff"], record["weeks"],
+                          record.get("symmetry", False))
+    base = {key(record): record for record in baseline}
+    print(f'{"case":<38} {"build":>8} {"solve":>8} {"memory":>8} {"objective":>10}')
+    for record in records:
+        ref = base.get(key(record))
+        if ref is None:
+            continue
+        ratio = lambda field: record[field] / ref[field] if ref[field] else float("nan")
+        print(f'{"/".join(str(part) for part in key(record)):<38} {ratio("build_time"):>8.2f} '
+              f'{ratio("solve_time"):>8.2f} {ratio("peak_memory_mb"):>8.2f} '
+              f'{record["objective"] - ref["objective"]:>10.1f}')
+
+
+def compare_symmetry(records):
+    #Solve time with symmetry breaking / without per grid cell, < 1 is an improvement
+    key = lambda record: (record["backend"], record["mode"], record["staff"], record["weeks"])
+    off = {key(record): record for record in records if not record.get("symmetry")}
+    print(f'{"case":<32} {"solve off":>10} {"solve on":>10} {"ratio":>8} {"objective":>10}')
+    for record in records:
+        ref = off.get(key(record))
+        if not record.get("symmetry") or ref is None:
+            continue
+        ratio = record["solve_time"] / ref["solve_time"] if ref["solve_time"] else float("nan")
+        print(f'{"/".join(str(part) for part in key(record)):<32} {ref["solve_time"]:>10.3f} '
+              f'{record["solve_time"]:>10.3f} {ratio:>8.2f} {record["objective"] - ref["objective"]:>10.1f}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="scheduling_data.json")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--mode", choices=SOLVE_MODES, default="elastic")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", default=None,
+                        help="JSON file for the backend comparison, JSON lines file for --grid")
+    parser.add_argument("--grid", action="store_true",
+                        help="benchmark generated instances instead of comparing backends on --data")
+    parser.add_argument("--staff", nargs="+", type=int, default=GRID_STAFF)
+    parser.add_argument("--weeks", nargs="+", type=int, default=GRID_WEEKS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds per weekly solve")
+    parser.add_argument("--baseline", default=None, help="JSON lines file of a previous --grid run")
+    parser.add_argument("--symmetry", choices=["off", "on", "both"], default="off",
+                        help="symmetry breaking of interchangeable staff in --grid cases, "
+                             "both compares solve times with and without it")
+    args = parser.parse_args()
+
+    if args.grid:
+        symmetries = {"off": (False,), "on": (True,), "both": (False, True)}[args.symmetry]
+        records = run_grid(args.staff, args.weeks, args.backends, args.mode, args.seed, args.output,
+                           args.time_limit, symmetries)
+        if args.symmetry == "both":
+            compare_symmetry(records)
+        if args.baseline:
+            compare_records(records, load_records(args.baseline))
+    else:
+        scheduling_data = load_data(args.data)
+
+        records = compare_backends(scheduling_data, args.backends, args.mode, args.threads)
+        print_summary(records)
+        if args.output:
+            with open(args.output, "w") as json_file:
+                json.dump(records, json_file, indent=4)
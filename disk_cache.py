@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+
+#Content-addressed on-disk cache shared by runs and worker processes.
+#Entries are files named by a hash of their inputs, the least recently used ones
+#are evicted once the directory grows over its size budget.
+#Disabled unless ROSTER_CACHE_DIR is set (main.py --cache-dir sets it).
+
+CACHE_DIR_ENV = "ROSTER_CACHE_DIR"
+CACHE_SIZE_ENV = "ROSTER_CACHE_MB"
+DEFAULT_CACHE_MB = 512
+
+
+def cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or None
+
+
+def cache_key(*parts):
+    #Stable hash of JSON-serialisable inputs
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def entry_path(kind, key):
+    return os.path.join(cache_dir(), f'{kind}-{key}')
+
+
+def cache_load(kind, key):
+    #Entry bytes or None, a hit refreshes the entry for LRU eviction
+    if not cache_dir():
+        return None
+    path = entry_path(kind, key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+    except OSError:
+        return None
+    return data
+
+
+def cache_store(kind, key, data):
+    if not cache_dir():
+        return
+    os.makedirs(cache_dir(), exist_ok=True)
+    path = entry_path(kind, key)
+    #Write then rename so concurrent readers never see a partial entry
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    evict()
+
+
+def evict(max_bytes=None):
+    #Drop least recently used entries until the cache fits its budget
+    if max_bytes is None:
+        max_bytes = float(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_MB)) * 1024 * 1024
+    entries = []
+    with os.scandir(cache_dir()) as it:
+        for entry in it:
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
@@ -0,0 +1,187 @@
+from solver_core import (SolveResult, build_index, week_days, HARD_PENALTY,
+                         RELAXABLE_CODES, SOLVE_MODES, WEEKLY_HOURS)
+from validator import RosterValidator, HARD_CODES
+from functools import lru_cache
+import time
+
+#Greedy construction of a weekly roster in time linear in staff x days, for
+#previews and as starting roster of the solver. Per staff: PH on holidays, the DO
+#and the half-day M3 on the days with the most spare staff, then the weekly hours
+#split into full shifts. Day by day the working staff are then split into morning
+#and afternoon: one afternoon and one morning per agency first, afternoons from
+#the staff for whom it breaks no DO-AM/PH-AM/3AM rule first.
+
+
+@lru_cache(maxsize=None)
+def split_hours(hours, days, durations):
+    #Durations of `days` shifts adding up to hours, fewest Empty (0 hours) days first.
+    #None when no split exists.
+    for empty in range(days + 1):
+        split = fill_hours(hours, days - empty, durations)
+        if split is not None:
+            return split + (0,) * empty
+    return None
+
+
+@lru_cache(maxsize=None)
+def fill_hours(hours, days, durations):
+    if days == 0:
+        return () if hours == 0 else None
+    for duration in durations:
+        if duration <= hours:
+            rest = fill_hours(hours - duration, days - 1, durations)
+            if rest is not None:
+                return (duration,) + rest
+    return None
+
+
+def construct_roster(scheduling_data, current_week, boundary=None):
+    #x_val ((staff, shift, day id) keys, as the solver) of the greedy roster.
+    #boundary is the roster before the week, read for its last two days.
+    index = build_index(scheduling_data["staffs"], scheduling_data["shifts"])
+    days = week_days(scheduling_data, current_week)
+    n = len(days)
+    staffs_list = index["staffs_list"]
+    duration = index["duration"]
+    boundary = boundary or {}
+
+    #Working shift per (shift type, hours), full shifts exist for both types
+    shift_of = {}
+    for shift_type in ("morning", "afternoon"):
+        for j in index["shift_type"].get(shift_type, []):
+            if j != "M3":
+                shift_of.setdefault((shift_type, duration[j]), j)
+    full_hours = tuple(sorted({h for t, h in shift_of if t == "morning"}
+                              & {h for t, h in shift_of if t == "afternoon"}, reverse=True))
+
+    #Staff still available and demand per day, DO/M3 go where most staff are spare
+    available = [len(staffs_list)] * n
+    demand = [day["morningShiftCov"] + day["afternoonShiftCov"] for day in days]
+    plan = {}
+    hours = {}
+    for i in staffs_list:
+        row = [None] * n
+        if i in index["off_on_ph"]:
+            for p, day in enumerate(days):
+                if day["isHoliday"]:
+                    row[p] = "PH"
+        for j in ["DO"] + (["M3"] if i in index["half_day"] else []):
+            free = [p for p in range(n) if row[p] is None]
+            if not free:
+                break
+            p = max(free, key=lambda p: available[p] - demand[p])
+            row[p] = j
+            if j == "DO":
+                available[p] -= 1
+        for p in range(n):
+            if row[p] == "PH":
+                available[p] -= 1
+
+        free = [p for p in range(n) if row[p] is None]
+        target = WEEKLY_HOURS - sum(duration[j] for j in row if j is not None)
+        split = split_hours(target, len(free), full_hours) if target >= 0 else None
+        if split is None:
+            #Best effort, the 44 hour rule is reported as unmet
+            split = (full_hours[0],) * len(free)
+        for p, h in zip(free, split):
+            if h == 0:
+                row[p] = "Empty"
+                available[p] -= 1
+            else:
+                hours[(i, p)] = h
+        plan[i] = row
+
+    #Day by day morning/afternoon split
+    agency_of = {i: a for a in index["agencies"] for i in index["agency"][a]}
+    afternoon_ids = set(index["shift_type"].get("afternoon", []))
+    prev_1 = days[0]["id"] - 1
+    prev_2 = days[0]["id"] - 2
+    prev_off = {i: boundary.get((i, "DO", prev_1), 0) > 0.5 or boundary.get((i, "PH", prev_1), 0) > 0.5
+                for i in staffs_list}
+    pm_before = lambda i, d: any(boundary.get((i, j, d), 0) > 0.5 for j in afternoon_ids)
+    streak = {i: (2 if pm_before(i, prev_2) else 1) if pm_before(i, prev_1) else 0
+              for i in staffs_list}
+
+    for p, day in enumerate(days):
+        working = [i for i in staffs_list if (i, p) in hours]
+        #Bucket 0: afternoon breaks nothing, 1: it extends a run of afternoons,
+        #2: it breaks DO-AM/PH-AM/3AM
+        buckets = [[], [], []]
+        for i in working:
+            if prev_off[i] or streak[i] >= 2:
+                buckets[2].append(i)
+            else:
+                buckets[streak[i]].append(i)
+        order = buckets[0] + buckets[1] + buckets[2]
+
+        afternoon = set()
+        reserved = set()
+        #One afternoon per agency, then one morning per agency (M3 staff already count)
+        for a in index["agencies"]:
+            for i in order:
+                if agency_of.get(i) == a:
+                    afternoon.add(i)
+                    break
+        morning_agencies = {agency_of.get(i) for i in staffs_list if plan[i][p] == "M3"}
+        for a in index["agencies"]:
+            if a in morning_agencies:
+                continue
+            for i in reversed(order):
+                if agency_of.get(i) == a and i not in afternoon:
+                    reserved.add(i)
+                    break
+        for i in order:
+            if len(afternoon) >= day["afternoonShiftCov"]:
+                break
+            if i not in reserved:
+                afternoon.add(i)
+
+        for i in working:
+            shift_type = "afternoon" if i in afternoon else "morning"
+            plan[i][p] = shift_of[(shift_type, hours[(i, p)])]
+        for i in staffs_list:
+            prev_off[i] = plan[i][p] in ("DO", "PH")
+            streak[i] = streak[i] + 1 if plan[i][p] in afternoon_ids else 0
+
+    return {(i, j, day["id"]): 1.0 if plan[i][p] == j else 0.0
+            for i in staffs_list for j in index["shifts_list"] for p, day in enumerate(days)}
+
+
+def greedy_roster(scheduling_data, current_week, boundary=None):
+    #Greedy x_val and the hard rules it could not meet ({code: {label: {"value", "name"}}},
+    #relaxable rules included)
+    x_val = construct_roster(scheduling_data, current_week, boundary)
+    slack_val = RosterValidator(scheduling_data, [current_week]).slack_values(x_val)
+    return x_val, unmet_rules(slack_val)
+
+
+def unmet_rules(slack_val):
+    return {code: slack_val[code] for code in HARD_CODES + RELAXABLE_CODES if slack_val[code]}
+
+
+def greedy_solve(scheduling_data, current_week, mode="elastic", boundary=None):
+    #Greedy roster as a SolveResult scored like the model: no roster in hard mode
+    #when a hard rule is unmet, relaxable slack weighted HARD_PENALTY in elastic mode
+    if mode not in SOLVE_MODES:
+        raise ValueError(f'Unknown solve mode: {mode}')
+    start = time.perf_counter()
+    x_val = construct_roster(scheduling_data, current_week, boundary)
+    slack_val = RosterValidator(scheduling_data, [current_week]).slack_values(x_val)
+    unmet = unmet_rules(slack_val)
+    info = {"engine": "greedy", "mode": mode, "unmet": {code: len(cells) for code, cells in unmet.items()},
+            "solve_time": time.perf_counter() - start}
+    if mode == "hard" and unmet:
+        print("Greedy roster breaks hard rules: " + ", ".join(unmet))
+        return SolveResult(None, None, dict(info, status="INFEASIBLE"))
+    weight = HARD_PENALTY if mode == "elastic" else 1
+    info["status"] = "FEASIBLE"
+    info["objective"] = sum(cell["value"] * (weight if code in RELAXABLE_CODES else 1)
+                            for code, cells in slack_val.items() if code not in HARD_CODES
+                            for cell in cells.values())
+    print(f'Greedy roster, objective value = {info["objective"]}')
+    for code in HARD_CODES:
+        del slack_val[code]
+    if mode == "hard":
+        for code in RELAXABLE_CODES:
+            del slack_val[code]
+    return SolveResult(x_val, slack_val, info)
@@ -0,0 +1,105 @@
+from datetime import date, timedelta
+import argparse
+import json
+import random
+
+#Pure Python generator for scheduling_data.json compatible instances
+
+#-----Default shift catalogue (same as json_generator.py)-----
+DEFAULT_SHIFTS = [
+    {"id": "M1", "duration": 8, "workingShift": True, "shiftType": "morning"},
+    {"id": "M2", "duration": 7, "workingShift": True, "shiftType": "morning"},
+    {"id": "M3", "duration": 4, "workingShift": True, "shiftType": "morning"},
+    {"id": "A1", "duration": 8, "workingShift": True, "shiftType": "afternoon"},
+    {"id": "A2", "duration": 7, "workingShift": True, "shiftType": "afternoon"},
+    {"id": "DO", "duration": 0, "workingShift": True, "shiftType": "other"},
+    {"id": "PH", "duration": 8, "workingShift": False, "shiftType": "other"},
+    {"id": "Empty", "duration": 0, "workingShift": False, "shiftType": "other"},
+]
+
+#Coverage per staff member of the shipped 9 staff instance
+MORNING_COV_RATIO = 4 / 9
+AFTERNOON_COV_RATIO = 3 / 9
+REDUCED_MORNING_COV_RATIO = 3 / 9
+
+
+def generate_instance(staff_num=9, agency_num=3, week_num=4, start_date="2019-12-09",
+                      holidays=("2019-12-24", "2019-12-25", "2019-12-31", "2020-01-01"),
+                      shifts=None, morning_cov=None, afternoon_cov=None, reduced_morning_cov=None,
+                      off_on_ph_ratio=1 / 3, half_day_ratio=0.0, fixed_group_ratio=1 / 9, seed=0):
+    rng = random.Random(seed)
+
+    #-----Coverage levels, scaled with the number of staff by default-----
+    if morning_cov is None:
+        morning_cov = max(1, round(staff_num * MORNING_COV_RATIO))
+    if afternoon_cov is None:
+        afternoon_cov = max(1, round(staff_num * AFTERNOON_COV_RATIO))
+    if reduced_morning_cov is None:
+        reduced_morning_cov = max(1, round(staff_num * REDUCED_MORNING_COV_RATIO))
+
+    #-----Generate staffs data-----
+    staffs = []
+    for idx in range(staff_num):
+        staff = {
+                    "id": idx + 1,
+                    "agency": f'Agency_{idx % agency_num + 1}',
+                    "fixedShiftGroup": rng.random() < fixed_group_ratio,
+                    "alwaysOffOnPH": rng.random() < off_on_ph_ratio,
+                    "desiredHalfDayShift": rng.random() < half_day_ratio,
+                }
+        staffs.append(staff)
+
+    #-----Generate periods data-----
+    first_day = date.fromisoformat(start_date)
+    holidays = set(holidays)
+    periods = []
+    for day_count in range(week_num * 7):
+        date_value = first_day + timedelta(days=day_count)
+        day = {
+                "date": date_value.strftime("%Y-%m-%d"),
+                "id": day_count,
+                "dayOfWeek": date_value.weekday(),
+                "dayType": "weekday",
+                "week": day_count // 7 + 1,
+                "morningShiftCov": morning_cov,
+                "afternoonShiftCov": afternoon_cov,
+                "isHoliday": False,
+            }
+        if day["dayOfWeek"] > 5:
+            day["dayType"] = "weekend"
+            day["morningShiftCov"] = reduced_morning_cov
+        elif day["date"] in holidays:
+            day["dayType"] = "Holiday"
+            day["isHoliday"] = True
+            day["morningShiftCov"] = reduced_morning_cov
+        periods.append(day)
+
+    return {
+        "staffs": staffs,
+        "shifts": [dict(shift) for shift in (shifts or DEFAULT_SHIFTS)],
+        "periods": periods,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--staff", type=int, default=9)
+    parser.add_argument("--agencies", type=int, default=3)
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--start-date", default="2019-12-09", help="should be a Monday")
+    parser.add_argument("--holidays", nargs="*", default=["2019-12-24", "2019-12-25", "2019-12-31", "2020-01-01"])
+    parser.add_argument("--morning-cov", type=int, default=None)
+    parser.add_argument("--afternoon-cov", type=int, default=None)
+    parser.add_argument("--off-on-ph-ratio", type=float, default=1 / 3)
+    parser.add_argument("--half-day-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="data/scheduling_data.json")
+    args = parser.parse_args()
+
+    scheduling_data = generate_instance(args.staff, args.agencies, args.weeks, args.start_date,
+                                        args.holidays, morning_cov=args.morning_cov,
+                                        afternoon_cov=args.afternoon_cov,
+                                        off_on_ph_ratio=args.off_on_ph_ratio,
+                                        half_day_ratio=args.half_day_ratio, seed=args.seed)
+    with open(args.output, "w") as json_file:
+        json.dump(scheduling_data, json_file, indent=4)
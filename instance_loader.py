@@ -0,0 +1,147 @@
+import argparse
+import json
+import time
+
+#Validated loading of scheduling_data.json. The input is checked once before any
+#model is built and every problem found is reported together, instead of
+#surfacing later as an empty or missing constraint (agency names that differ only
+#in case, unknown shift types, missing DO/PH/M3 shifts, gaps in the day ids).
+#The result is the scheduling_data dict the solver modules work on, restricted to
+#the fields they read.
+
+SHIFT_TYPES = ["morning", "afternoon", "other"]
+
+#Shifts the rules refer to by id
+REQUIRED_SHIFTS = ["DO", "PH", "M3"]
+
+NUMBER = (int, float)
+
+#(JSON key, type) of the fields read per record
+STAFF_FIELDS = [("id", int), ("agency", str), ("fixedShiftGroup", bool), ("alwaysOffOnPH", bool),
+                ("desiredHalfDayShift", bool)]
+SHIFT_FIELDS = [("id", str), ("duration", NUMBER), ("workingShift", bool), ("shiftType", str)]
+PERIOD_FIELDS = [("date", str), ("id", int), ("dayOfWeek", int), ("dayType", str), ("week", int),
+                 ("morningShiftCov", int), ("afternoonShiftCov", int), ("isHoliday", bool)]
+
+
+def type_name(expected):
+    return "number" if expected is NUMBER else expected.__name__
+
+
+def has_type(value, expected):
+    #bool is an int subclass, flags and numbers are kept apart
+    if expected is bool:
+        return isinstance(value, bool)
+    return isinstance(value, expected) and not isinstance(value, bool)
+
+
+def check_records(items, fields, section, problems):
+    #Records of a section with every field present and typed, restricted to those fields
+    if not isinstance(items, list) or not items:
+        problems.append(f'"{section}" must be a non-empty list')
+        return []
+    records = []
+    for n, item in enumerate(items):
+        where = f'{section}[{n}]'
+        if not isinstance(item, dict):
+            problems.append(f'{where} is not an object')
+            continue
+        valid = True
+        for key, expected in fields:
+            if key not in item:
+                problems.append(f'{where} has no "{key}"')
+                valid = False
+            elif not has_type(item[key], expected):
+                problems.append(f'{where}.{key} must be a {type_name(expected)}, got {item[key]!r}')
+                valid = False
+        if valid:
+            records.append({key: item[key] for key, _ in fields})
+    return records
+
+
+def check_unique(records, section, problems):
+    seen = set()
+    for record in records:
+        if record["id"] in seen:
+            problems.append(f'{section} id {record["id"]!r} is not unique')
+        seen.add(record["id"])
+
+
+def validate_data(raw, source="scheduling data"):
+    #scheduling_data dict of the decoded JSON, ValueError listing every problem found
+    if not isinstance(raw, dict):
+        raise ValueError(f'Invalid {source}: expected an object with staffs, shifts and periods')
+    problems = []
+    staffs = check_records(raw.get("staffs"), STAFF_FIELDS, "staffs", problems)
+    shifts = check_records(raw.get("shifts"), SHIFT_FIELDS, "shifts", problems)
+    days = check_records(raw.get("periods"), PERIOD_FIELDS, "periods", problems)
+    if problems:
+        raise ValueError(f'Invalid {source}:\n' + "\n".join(f'  {p}' for p in problems))
+
+    check_unique(staffs, "staff", problems)
+    check_unique(shifts, "shift", problems)
+    check_unique(days, "period", problems)
+
+    #Agency names are matched exactly, spellings that differ only in case are two agencies
+    spellings = {}
+    for staff in staffs:
+        spellings.setdefault(staff["agency"].lower(), set()).add(staff["agency"])
+    for names in spellings.values():
+        if len(names) > 1:
+            problems.append(f'agency spelled differently: {", ".join(sorted(names))}')
+
+    for shift in shifts:
+        if shift["shiftType"] not in SHIFT_TYPES:
+            problems.append(f'shift {shift["id"]} has unknown shiftType {shift["shiftType"]!r}, '
+                            f'expected one of {", ".join(SHIFT_TYPES)}')
+        if shift["duration"] < 0:
+            problems.append(f'shift {shift["id"]} has a negative duration')
+    shift_ids = {shift["id"] for shift in shifts}
+    for j in REQUIRED_SHIFTS:
+        if j not in shift_ids:
+            problems.append(f'shift {j} is missing, the rules refer to it')
+
+    #Days follow each other: consecutive ids, weeks in order, one to seven days a week
+    for prev, day in zip(days, days[1:]):
+        if day["id"] != prev["id"] + 1:
+            problems.append(f'period id {day["id"]} does not follow {prev["id"]}')
+        if day["week"] < prev["week"]:
+            problems.append(f'period {day["id"]} is in week {day["week"]} after week {prev["week"]}')
+    week_sizes = {}
+    for day in days:
+        week_sizes[day["week"]] = week_sizes.get(day["week"], 0) + 1
+        if not 0 <= day["dayOfWeek"] <= 6:
+            problems.append(f'period {day["id"]} has dayOfWeek {day["dayOfWeek"]}, expected 0-6')
+        if day["morningShiftCov"] < 0 or day["afternoonShiftCov"] < 0:
+            problems.append(f'period {day["id"]} has a negative coverage')
+    for week, size in week_sizes.items():
+        if size > 7:
+            problems.append(f'week {week} has {size} days')
+
+    if problems:
+        raise ValueError(f'Invalid {source}:\n' + "\n".join(f'  {p}' for p in problems))
+    return {"staffs": staffs, "shifts": shifts, "periods": days}
+
+
+def load_data(path="scheduling_data.json"):
+    #scheduling_data dict of the validated file
+    with open(path, "r") as f:
+        try:
+            raw = json.load(f)
+        except ValueError as error:
+            raise ValueError(f'Invalid {path}: {error}') from None
+    return validate_data(raw, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="scheduling_data.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    scheduling_data = load_data(args.data)
+    weeks = {day["week"] for day in scheduling_data["periods"]}
+    agencies = sorted({staff["agency"] for staff in scheduling_data["staffs"]})
+    print(f'{args.data}: {len(scheduling_data["staffs"])} staff, {len(scheduling_data["shifts"])} shifts, '
+          f'{len(scheduling_data["periods"])} days in {len(weeks)} weeks, '
+          f'agencies {", ".join(agencies)} ({time.perf_counter() - start:.3f}s)')
@@ -0,0 +1,116 @@
+from solver_core import SolveResult, get_model, horizon_days
+from heuristic import construct_roster
+import random
+import time
+
+#Large neighbourhood search on top of RosterModel. Starting from a feasible
+#roster, each move frees a neighbourhood (a window of days, one agency or the
+#staff with the most soft violations), fixes every other assignment and
+#re-solves with a short time limit and the incumbent as hint. Improvements are
+#kept, so the sub-models stay small however large the instance gets.
+
+NEIGHBOURHOODS = ["days", "agency", "worst"]
+
+
+def staff_slack(slack_val):
+    #Soft violations per staff from the per-staff slack families
+    totals = {}
+    for values in slack_val.values():
+        for label, info in values.items():
+            if isinstance(label, tuple) and label[0].startswith("staff_"):
+                i = int(label[0][len("staff_"):])
+                totals[i] = totals.get(i, 0) + info["value"]
+    return totals
+
+
+def pick_neighbourhood(kind, rng, index, day_ids, slack_val, window, worst_count):
+    #(staff ids, day ids) freed by one move
+    staffs_list = index["staffs_list"]
+    if kind == "days":
+        start = rng.randrange(max(len(day_ids) - window + 1, 1))
+        return staffs_list, day_ids[start:start + window]
+    if kind == "agency":
+        agency = rng.choice(sorted(index["agency"]))
+        return index["agency"][agency], day_ids
+    if kind == "worst":
+        totals = staff_slack(slack_val)
+        ranked = sorted(staffs_list, key=lambda i: (-totals.get(i, 0), rng.random()))
+        return ranked[:worst_count], day_ids
+    raise ValueError(f'Unknown neighbourhood: {kind}')
+
+
+def lns_solve(scheduling_data, weeks, mode="elastic", backend="SCIP", time_limit=None, boundary=None,
+              roster=None, iterations=100, sub_time_limit=1.0, start_time_limit=None, window=2,
+              neighbourhoods=NEIGHBOURHOODS, seed=0, callback=None, initial="greedy"):
+    #time_limit bounds the whole search (None: iterations only), sub_time_limit each re-solve.
+    #roster is a starting x_val ((staff, shift, day id) keys) completed by the solver.
+    #Without it the search starts from the greedy roster (initial="greedy") or from a
+    #full solve (initial="solve"), stopped at start_time_limit (default a quarter of
+    #time_limit, or 10 re-solves).
+    #callback(elapsed, objective, neighbourhood) is called on every new incumbent.
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    days = horizon_days(scheduling_data, weeks)
+    day_ids = [day["id"] for day in days]
+    model = get_model(scheduling_data, days, backend)
+    worst_count = max(1, len(model.index["staffs_list"]) // 10)
+    trace = []
+    if start_time_limit is None:
+        start_time_limit = time_limit / 4 if time_limit else 10 * sub_time_limit
+
+    def report(result, kind):
+        elapsed = time.perf_counter() - start
+        trace.append({"time": elapsed, "objective": result.objective, "neighbourhood": kind})
+        print(f'LNS {elapsed:8.3f}s  objective {result.objective:g}  ({kind})')
+        if callback:
+            callback(elapsed, result.objective, kind)
+
+    if roster is None and initial == "greedy":
+        roster = dict(boundary or {})
+        for current_week in weeks:
+            roster.update(construct_roster(scheduling_data, current_week, roster))
+    fixed = {key: 1 for key, val in (roster or {}).items() if val > 0.5 and key[2] in day_ids}
+    best = model.solve(days, mode, hint=roster, time_limit=start_time_limit, boundary=boundary,
+                       repair={"fixed": fixed}, check_hint=False)
+    if best[0] is None and fixed:
+        print("Starting roster cannot be completed, LNS starts from a full solve")
+        fixed = {}
+        best = model.solve(days, mode, time_limit=start_time_limit, boundary=boundary, check_hint=False)
+    if best[0] is None:
+        print("LNS found no starting roster")
+        return best
+    report(best, "start")
+    #Bound of the starting solve holds for the whole search unless a roster was imposed
+    bound = None if fixed else best.info.get("best_bound")
+    proven = not fixed and best.status == "OPTIMAL"
+
+    moves = 0
+    improvements = 0
+    while not proven and moves < iterations and best.objective > 0:
+        elapsed = time.perf_counter() - start
+        if time_limit is not None and elapsed >= time_limit:
+            break
+        kind = neighbourhoods[moves % len(neighbourhoods)]
+        staff_ids, free_ids = pick_neighbourhood(kind, rng, model.index, day_ids, best[1],
+                                                 window, worst_count)
+        free = {(i, d) for i in staff_ids for d in free_ids}
+        fixed = {(i, j, d): 1 for (i, j, d), val in best[0].items()
+                 if val > 0.5 and (i, d) not in free}
+        limit = sub_time_limit if time_limit is None else min(sub_time_limit, time_limit - elapsed)
+        result = model.solve(days, mode, hint=best[0], time_limit=max(limit, 0.01), boundary=boundary,
+                             repair={"fixed": fixed}, check_hint=False)
+        moves += 1
+        if result[0] is not None and result.objective < best.objective - 1e-6:
+            best = result
+            improvements += 1
+            report(best, kind)
+
+    info = dict(best.info, engine="lns", lns_moves=moves, lns_improvements=improvements,
+                lns_trace=trace, solve_time=time.perf_counter() - start,
+                status="OPTIMAL" if proven else "FEASIBLE", best_bound=bound)
+    if bound is None:
+        info["gap"] = None
+    else:
+        objective = info["objective"]
+        info["gap"] = abs(objective - bound) / max(abs(objective), 1e-9) if objective else 0.0
+    return SolveResult(best[0], best[1], info)
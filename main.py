@@ -1,125 +1,170 @@
-from solver_core import hard_solve, relaxed_solve
+from solver_core import (solve_week, rolling_weeks, get_model, shift_roster, format_model_stats,
+                         week_fingerprint, reuse_week, week_days, BACKENDS, ENGINES)
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import argparse
 import json
+import os
+from disk_cache import CACHE_DIR_ENV
+from instance_loader import load_data, validate_data
+from result_writer import ResultWriter, OUTPUT_FORMATS
+from table_export import TableExporter, TABLE_FORMATS
 from ortools.linear_solver import pywraplp
 
-with open("scheduling_data.json", "r") as f:
-    scheduling_data = json.load(f)
 
-staffs = scheduling_data["staffs"]
-shifts = scheduling_data["shifts"]
-period = scheduling_data["periods"]
-
-staffs_list = [staff["id"] for staff in staffs]
-slack = []
-shifts_list = [shift["id"] for shift in shifts]
-
-#Define solution structure
-scheduling_result = {}
-violations = {}
-
-roster_per_day = []
-
-roster_per_staff = []
-roster_staffs = {}
-for staff in staffs:
-     i = staff["id"]
-     code = f'staff_{i}'
-     roster_staffs.setdefault(code, [])
-
-
-def export_result(x_var, slack_var, current_week):
-    roster_days = {}
-    days = [day for day in period 
-            if day["week"] == current_week]
-
-    #View roster per day
-    for day in days:
-             k = day["dayOfWeek"]
-             code = (f'day_{day["id"]}')
-             roster_days.setdefault(code, [])
-             for staff in staffs:
-                  i = staff["id"]
-                  for shift in shifts:
-                       j = shift["id"]
-                       val = x_var.get((i,j,k), 0)
-                       if val > 0.5:
-                            cell = {
-                                 "day": day["date"],
-                                 "week": day["week"],
-                                 "staff": i,
-                                 "agency": staff["agency"],
-                                 "shift": j,                           
-                            }
-                            roster_days[code].append(cell)
-    roster_per_day.append(roster_days)
-
-    #View roster per staff
-    for staff in staffs:
-            i = staff["id"]
-            code = f'staff_{i}'
-            for day in days:
-                k = day["dayOfWeek"]
-                for shift in shifts:
-                    j = shift["id"]
-                    val = x_var.get((i,j,k), 0)
-                    if val > 0.5:
-                        cell = {
-                                "date": day["date"],
-                                "week": day["week"],
-                                "day": k,
-                                "dayOfWeek": day["dayOfWeek"],
-                                "dayType": day["dayType"],
-                                "shift": j,
-                        }
-                        roster_staffs[code].append(cell)
-    
-
-    # #View slack variables created per week
-    w_code = f'week_{current_week}'
-    violations.setdefault(w_code, {})
-
-    for s_code, s_dict in slack_var.items():
-        violations[w_code].setdefault(s_code, [])
-        for key, s_info in s_dict.items():
-            val = s_info["value"]
-
-            if val > 0:
-                violations[w_code][s_code].append({
-                    "key": str(key),
-                    "slack": val,
-                })
-        
-def run_solver():
-    week_list = [1, 2, 3, 4]
-    for current_week in week_list:
-        print("---------Start solving for ", f'week {current_week}---------')
-        result = hard_solve(scheduling_data, current_week)
-        if result[0] == None:
-            print("Switch to relaxed model...")
-            result = relaxed_solve(scheduling_data, current_week)
+def write_trace(trace_dir, current_week, result):
+    #One JSON trace per week with the telemetry of its solve
+    os.makedirs(trace_dir, exist_ok=True)
+    with open(os.path.join(trace_dir, f'week_{current_week}.json'), "w") as json_file:
+        json.dump(dict(result.info, week=current_week), json_file, indent=4)
+
+
+def run_solver(workers=1, elastic=True, warm_start=False, backend="SCIP", model_stats=False,
+               trace_dir=None, time_limit=None, gap=None, horizon_weeks=None, commit_weeks=1,
+               engine="mip", memo=True, symmetry=False, screen=True, output_format="json", tables=None,
+               data="scheduling_data.json", result_dir="result/Q1"):
+    #data is the input file or an already decoded scheduling_data dict. It is read and
+    #validated when a solve is requested, not on import.
+    #Returns {week: SolveResult}.
+    scheduling_data = load_data(data) if isinstance(data, str) else validate_data(data)
+    period = scheduling_data["periods"]
+    week_list = sorted({day["week"] for day in period})
+    if model_stats:
+        days = [day for day in period if day["week"] in week_list[:horizon_weeks or 1]]
+        model = get_model(scheduling_data, days, backend, symmetry)
+        print(format_model_stats(model.stats))
+    if horizon_weeks and engine != "mip":
+        raise ValueError("Rolling horizon solving needs the mip engine")
+
+    #Every path yields its weeks in week order as they are solved, each is written out
+    #at once. Excel/CSV/Parquet tables are built from the same results, without the JSON files.
+    exporter = TableExporter(scheduling_data, result_dir, tables) if tables else None
+
+    def serial_weeks():
+        #Warm start hints each week with the previous week's roster moved by 7 days
+        hint = None
+        #Week memo of this run only
+        week_memo = {} if memo else None
+        for current_week in week_list:
+            result = solve_week(scheduling_data, current_week, elastic, hint, backend,
+                                time_limit, gap, engine=engine, memo=week_memo, symmetry=symmetry,
+                                screen=screen)
+            yield result
+            if warm_start and result[0] is not None:
+                hint = shift_roster(result[0], 7)
+
+    def parallel_weeks():
+        #Weeks are independent, the pool results are taken in week order.
+        #Only the first of each group of identical weeks is sent to the pool.
+        sources = {}
+        for current_week in week_list:
+            key = week_fingerprint(scheduling_data, current_week, elastic, backend, time_limit, gap, engine,
+                                   symmetry)
+            sources[current_week] = sources.setdefault(key if memo else current_week, current_week)
+        unique_weeks = [w for w in week_list if sources[w] == w]
+        solved = {}
+        with ProcessPoolExecutor(max_workers=min(workers, len(unique_weeks))) as executor:
+            pending = executor.map(solve_week, repeat(scheduling_data), unique_weeks,
+                                   repeat(elastic), repeat(None), repeat(backend),
+                                   repeat(time_limit), repeat(gap), repeat(None),
+                                   repeat(engine), repeat(None), repeat(symmetry), repeat(screen))
+            for current_week in week_list:
+                source = sources[current_week]
+                if source == current_week:
+                    solved[current_week] = next(pending)
+                    yield solved[current_week]
+                else:
+                    yield reuse_week(scheduling_data, solved[source], source,
+                                     week_days(scheduling_data, source)[0]["id"], current_week)
+
+    if horizon_weeks:
+        #Rolling horizon: windows of horizon_weeks, commit_weeks kept per solve
+        weeks = rolling_weeks(scheduling_data, week_list, horizon_weeks, commit_weeks, elastic,
+                              warm_start, backend, time_limit, gap, symmetry)
+    elif workers > 1:
+        weeks = parallel_weeks()
+    else:
+        weeks = serial_weeks()
+
+    os.makedirs(result_dir, exist_ok=True)
+    results = []
+    #Closed on failure too, the files written so far stay valid documents
+    with ResultWriter(scheduling_data, result_dir, output_format) as writer:
+        for current_week, result in zip(week_list, weeks):
+            results.append(result)
+            if trace_dir:
+                write_trace(trace_dir, current_week, result)
             x_var, slack_var = result
-            export_result(x_var, slack_var, current_week)
-        else:
-             x_var, slack_var = result
-             export_result(x_var, slack_var, current_week)
-
-    #Add processed rosters for staff out side loop to avoid duplication
-    roster_per_staff.append(roster_staffs)
-
-    # #Dump data to json
-    scheduling_result = {
-            "roster_per_day": roster_per_day,
-            "roster_per_staff": roster_per_staff
-            }
-    with open("result/Q1/scheduling_result.json", "w") as json_file:
-            json.dump(scheduling_result, json_file, indent=4)
+            if x_var is None:
+                print(f'No roster found for week {current_week} ({result.status})')
+                continue
+            writer.write_week(current_week, x_var, slack_var)
+            if exporter:
+                exporter.add_week(current_week, x_var, slack_var)
+    if warm_start and not horizon_weeks and workers <= 1:
+        hinted = [result.info["solve_time"] for result in results[1:] if "memo_of" not in result.info]
+        print(f'Warm start: cold solve {results[0].info["solve_time"]:.3f}s, '
+              f'hinted solve {sum(hinted) / max(len(hinted), 1):.3f}s on average')
     print("Successfully export scheduling results to json")
-
-    with open("result/Q1/violations.json", "w") as json_file:
-        json.dump(violations, json_file, indent=4)
     print("Successfully export violation results to json")
+    if exporter:
+        for path in exporter.write():
+            print(f'Successfully export {path}')
+    return dict(zip(week_list, results))
 
 if __name__ == "__main__":
-    run_solver()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="scheduling_data.json",
+                        help="scheduling input, validated before solving")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes used to solve weeks in parallel")
+    parser.add_argument("--no-elastic", dest="elastic", action="store_false",
+                        help="solve the hard model first and fall back to the relaxed model")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="hint each solve with the previous roster (serial and rolling modes only)")
+    parser.add_argument("--backend", choices=BACKENDS, default="SCIP",
+                        help="solver engine used for the weekly model")
+    parser.add_argument("--model-stats", action="store_true",
+                        help="print variable/row counts per constraint family of the weekly model")
+    parser.add_argument("--trace-dir", default=None,
+                        help="write a JSON telemetry trace per week to this directory")
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help="time budget per week in seconds, the best roster found is kept")
+    parser.add_argument("--gap", type=float, default=None,
+                        help="relative MIP gap at which a solve stops, e.g. 0.01")
+    parser.add_argument("--horizon-weeks", type=int, default=None,
+                        help="rolling horizon: solve this many weeks at once, carrying the roster forward")
+    parser.add_argument("--commit-weeks", type=int, default=1,
+                        help="weeks kept from each rolling horizon solve")
+    parser.add_argument("--engine", choices=ENGINES, default="mip",
+                        help="per-staff MIP model, pattern-based model or large neighbourhood "
+                             "search within --time-limit (weekly solves only)")
+    parser.add_argument("--no-memo", dest="memo", action="store_false",
+                        help="solve every week even when an earlier week has identical inputs")
+    parser.add_argument("--symmetry", action="store_true",
+                        help="break the symmetry of interchangeable staff in the mip model")
+    parser.add_argument("--no-screen", dest="screen", action="store_false",
+                        help="always attempt the hard model first with --no-elastic, without the "
+                             "pre-solve feasibility screening")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="json",
+                        help="indented JSON, compact JSON or one JSON line per week (.ndjson files)")
+    parser.add_argument("--tables", nargs="+", choices=TABLE_FORMATS, default=None,
+                        help="also write the staff x day roster and the violations as tables "
+                             "(roster.xlsx, .csv, .parquet in the result directory)")
+    parser.add_argument("--result-dir", default="result/Q1",
+                        help="directory the result files are written to")
+    parser.add_argument("--cache-dir", default=None,
+                        help="keep compiled models and shift patterns in this directory across runs")
+    args = parser.parse_args()
+    if args.cache_dir:
+        #Read by disk_cache, worker processes inherit it
+        os.environ[CACHE_DIR_ENV] = args.cache_dir
+    run_solver(workers=args.workers, elastic=args.elastic, warm_start=args.warm_start,
+               backend=args.backend, model_stats=args.model_stats, trace_dir=args.trace_dir,
+               time_limit=args.time_limit, gap=args.gap, horizon_weeks=args.horizon_weeks,
+               commit_weeks=args.commit_weeks, engine=args.engine,
+               memo=args.memo, symmetry=args.symmetry, screen=args.screen,
+               output_format=args.output_format, tables=args.tables, data=args.data,
+               result_dir=args.result_dir)
 
 
@@ -0,0 +1,264 @@
+from solver_core import (SolveResult, build_index, staff_classes, solve_params, solver_telemetry,
+                         hard_slack_used, week_days, BACKENDS, HARD_PENALTY, RELAXABLE_CODES,
+                         SOLVE_MODES, WEEKLY_HOURS)
+from disk_cache import cache_key, cache_load, cache_store
+from ortools.linear_solver import pywraplp
+import json
+import time
+
+#Pattern-based weekly engine. A staff member's week is one of a small number of
+#valid shift sequences (1 DO, 44 hours, M3 only if desiredHalfDayShift, PH on
+#holidays if alwaysOffOnPH), enumerated per staff profile and holiday layout with
+#its soft penalties (DO-AM, PH-AM, 3AM) pre-scored. The solver only decides how
+#many staff of each interchangeable class work each pattern under the coverage and
+#agency rows, so the per-staff rules of RosterModel hold by construction.
+
+_pattern_cache = {}
+
+
+def enumerate_patterns(index, holidays, off_on_ph, half_day):
+    #All valid shift sequences for one staff profile over days with the given holiday flags
+    #Kept per process and in the on-disk cache, patterns only depend on these inputs
+    key = (tuple(sorted(index["duration"].items())), tuple(holidays), off_on_ph, half_day)
+    if key in _pattern_cache:
+        return _pattern_cache[key]
+    disk_key = cache_key("patterns", WEEKLY_HOURS, *key)
+    data = cache_load("patterns", disk_key)
+    if data is not None:
+        patterns = [tuple(pattern) for pattern in json.loads(data)]
+        _pattern_cache[key] = patterns
+        return patterns
+
+    duration = index["duration"]
+    free_shifts = [j for j in index["shifts_list"] if j != "PH"]
+    max_free = max(duration[j] for j in free_shifts)
+    forced = [off_on_ph and holiday for holiday in holidays]
+    n = len(holidays)
+
+    #Most hours still reachable from each day on, used to prune
+    suffix_max = [0] * (n + 1)
+    for p in range(n - 1, -1, -1):
+        suffix_max[p] = suffix_max[p + 1] + (duration["PH"] if forced[p] else max_free)
+
+    patterns = []
+    pattern = []
+
+    def extend(hours, do_used, m3_used):
+        p = len(pattern)
+        if p == n:
+            if hours == WEEKLY_HOURS and do_used and m3_used == half_day:
+                patterns.append(tuple(pattern))
+            return
+        if hours + suffix_max[p] < WEEKLY_HOURS:
+            return
+        for j in (["PH"] if forced[p] else free_shifts):
+            if j == "DO" and do_used:
+                continue
+            if j == "M3" and (m3_used or not half_day):
+                continue
+            if hours + duration[j] > WEEKLY_HOURS:
+                continue
+            pattern.append(j)
+            extend(hours + duration[j], do_used or j == "DO", m3_used or j == "M3")
+            pattern.pop()
+
+    extend(0, False, False)
+    _pattern_cache[key] = patterns
+    cache_store("patterns", disk_key, json.dumps(patterns).encode())
+    return patterns
+
+
+def pattern_slacks(pattern, afternoon_ids, state=(0, 0, 0, 0)):
+    #Soft violations of one pattern keyed like RosterModel slacks: position -1 is
+    #the day before the week, state is (DO, PH, afternoon) on that day and
+    #afternoon on the day before it, from the committed roster
+    do_1, ph_1, pm_1, pm_2 = state
+    n = len(pattern)
+    pm = [1 if j in afternoon_ids else 0 for j in pattern]
+
+    slacks = {"DO-AM_shifts": {}, "PH-AM_shifts": {}, "3AM_shifts": {}}
+    for code, off, prev in [("DO-AM_shifts", "DO", do_1), ("PH-AM_shifts", "PH", ph_1)]:
+        slacks[code][-1] = max(0, prev + pm[0] - 1)
+        for p in range(n - 1):
+            slacks[code][p] = max(0, (pattern[p] == off) + pm[p + 1] - 1)
+    slacks["3AM_shifts"][-1] = max(0, pm_2 + pm_1 + pm[0] - 2)
+    if n > 1:
+        slacks["3AM_shifts"][0] = max(0, pm_1 + pm[0] + pm[1] - 2)
+    for p in range(1, n - 1):
+        slacks["3AM_shifts"][p] = max(0, pm[p - 1] + pm[p] + pm[p + 1] - 2)
+    return slacks
+
+
+def boundary_state(boundary, i, first_id, afternoon_ids):
+    if not boundary:
+        return (0, 0, 0, 0)
+    return (round(boundary.get((i, "DO", first_id - 1), 0)),
+            round(boundary.get((i, "PH", first_id - 1), 0)),
+            sum(round(boundary.get((i, j, first_id - 1), 0)) for j in afternoon_ids),
+            sum(round(boundary.get((i, j, first_id - 2), 0)) for j in afternoon_ids))
+
+
+def pattern_solve(scheduling_data, current_week, mode="elastic", backend="SCIP",
+                  time_limit=None, gap=None, boundary=None):
+    if mode not in SOLVE_MODES:
+        raise ValueError(f'Unknown solve mode: {mode}')
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown solver backend: {backend}')
+    build_start = time.perf_counter()
+
+    #Define sets and indices
+    staffs = scheduling_data["staffs"]
+    index = build_index(staffs, scheduling_data["shifts"])
+    days = week_days(scheduling_data, current_week)
+    positions = range(len(days))
+    holidays = tuple(day["isHoliday"] for day in days)
+    morning_ids = set(index["shift_type"].get("morning", []))
+    afternoon_ids = set(index["shift_type"].get("afternoon", []))
+    first_id = days[0]["id"]
+
+    #Interchangeable staff (staff_classes) split further by boundary state
+    classes = {}
+    for (agency, off_on_ph, half_day, fixed_group), members in staff_classes(staffs).items():
+        for i in members:
+            key = (agency, off_on_ph, half_day, boundary_state(boundary, i, first_id, afternoon_ids))
+            classes.setdefault(key, []).append(i)
+
+    solver = pywraplp.Solver.CreateSolver(backend)
+    if solver is None:
+        raise RuntimeError(f'Solver backend {backend} is not available in this OR-Tools build')
+    infinity = solver.infinity()
+    objective = solver.Objective()
+    relax_ub = 0 if mode == "hard" else infinity
+    relax_weight = HARD_PENALTY if mode == "elastic" else 1
+
+    #Define decision variables: number of staff of a class working a pattern
+    n = {}
+    class_patterns = {}
+    cov_terms = {("morning", p): [] for p in positions}
+    cov_terms.update({("afternoon", p): [] for p in positions})
+    agency_terms = {}
+    pattern_count = 0
+    for c, (key, members) in enumerate(classes.items()):
+        agency, off_on_ph, half_day, state = key
+        #Coverage rows only see the shift type per day, keep the cheapest
+        #pattern of each shift type sequence
+        cheapest = {}
+        for pattern in enumerate_patterns(index, holidays, off_on_ph, half_day):
+            types = tuple("morning" if j in morning_ids else "afternoon" if j in afternoon_ids else None
+                          for j in pattern)
+            cost = sum(sum(values.values()) for values in pattern_slacks(pattern, afternoon_ids, state).values())
+            if types not in cheapest or cost < cheapest[types][0]:
+                cheapest[types] = (cost, pattern)
+        class_patterns[c] = [pattern for cost, pattern in cheapest.values()]
+        pattern_count += len(cheapest)
+        for q, (types, (cost, pattern)) in enumerate(cheapest.items()):
+            var = solver.IntVar(0, len(members), f'n_{c}_{q}')
+            n[(c, q)] = var
+            objective.SetCoefficient(var, cost)
+            for p, shift_type in enumerate(types):
+                if shift_type:
+                    cov_terms[(shift_type, p)].append(var)
+                    agency_terms.setdefault((shift_type, p, agency), []).append(var)
+
+    #Every staff member works exactly one pattern (hard)
+    for c, (key, members) in enumerate(classes.items()):
+        row = solver.Constraint(len(members), len(members))
+        for q in range(len(class_patterns[c])):
+            row.SetCoefficient(n[(c, q)], 1)
+
+    #Morning/afternoon shift coverage requirement (hard, relaxable)
+    s = {}
+    for shift_type, code_1, code_2, cov in [("morning", "+AM_General_Cov", "-AM_General_Cov", "morningShiftCov"),
+                                            ("afternoon", "+PM_General_Cov", "-PM_General_Cov", "afternoonShiftCov")]:
+        s[code_1] = {}
+        s[code_2] = {}
+        for p in positions:
+            v_add = solver.NumVar(0, relax_ub, f'{code_1}_{p}')
+            v_minus = solver.NumVar(0, relax_ub, f'{code_2}_{p}')
+            s[code_1][p] = v_add
+            s[code_2][p] = v_minus
+            row = solver.Constraint(days[p][cov], days[p][cov])
+            for var in cov_terms[(shift_type, p)]:
+                row.SetCoefficient(var, 1)
+            row.SetCoefficient(v_add, -1)
+            row.SetCoefficient(v_minus, 1)
+            objective.SetCoefficient(v_add, relax_weight)
+            objective.SetCoefficient(v_minus, relax_weight)
+
+    #Morning Agency coverage requirement (soft)
+    #Afternoon Agency coverage requirement (hard, relaxable)
+    for shift_type, code in [("morning", "Morning_Agency_Cov"), ("afternoon", "Afternoon_Agency_Cov")]:
+        s[code] = {}
+        for p in positions:
+            for a in index["agencies"]:
+                if code in RELAXABLE_CODES:
+                    v = solver.NumVar(0, relax_ub, f'{code}_{p}_{a}')
+                    objective.SetCoefficient(v, relax_weight)
+                else:
+                    v = solver.IntVar(0, infinity, f'{code}_{p}_{a}')
+                    objective.SetCoefficient(v, 1)
+                s[code][(p, a)] = v
+                row = solver.Constraint(1, infinity)
+                row.SetCoefficient(v, 1)
+                for var in agency_terms.get((shift_type, p, a), []):
+                    row.SetCoefficient(var, 1)
+    objective.SetMinimization()
+
+    info = {"engine": "pattern", "mode": mode, "backend": backend,
+            "classes": len(classes), "patterns": pattern_count,
+            "build_time": time.perf_counter() - build_start}
+
+    params = solve_params(solver, time_limit, gap, mode)
+    start = time.perf_counter()
+    status = solver.Solve(params)
+    info["solve_time"] = time.perf_counter() - start
+    info.update(solver_telemetry(solver, status))
+
+    if status == pywraplp.Solver.OPTIMAL:
+        print("Find optimal solution!")
+        print(f'Objective value = {solver.Objective().Value()}')
+    elif status == pywraplp.Solver.FEASIBLE:
+        print(f'Find feasible solution, gap = {info["gap"]:.2%}')
+        print(f'Objective value = {solver.Objective().Value()}')
+    elif status == pywraplp.Solver.INFEASIBLE:
+        print('Infeasible solution!')
+        return SolveResult(None, None, info)
+    else:
+        print("Solver can not find any solution!")
+        return SolveResult(None, None, info)
+
+    #Hand out the selected patterns to the members of each class
+    start = time.perf_counter()
+    assigned = {}
+    for c, (key, members) in enumerate(classes.items()):
+        queue = list(members)
+        for q, pattern in enumerate(class_patterns[c]):
+            for _ in range(round(n[(c, q)].solution_value())):
+                assigned[queue.pop(0)] = (pattern, key[3])
+
+    day_id = lambda p: days[p]["id"] if p >= 0 else first_id + p
+    x_val = {(i, j, day["id"]): 0.0
+             for i in index["staffs_list"] for j in index["shifts_list"] for day in days}
+    slack_val = {"DO-AM_shifts": {}, "PH-AM_shifts": {}, "3AM_shifts": {}}
+    for i in index["staffs_list"]:
+        pattern, state = assigned[i]
+        for p, j in enumerate(pattern):
+            x_val[(i, j, days[p]["id"])] = 1.0
+        for code, values in pattern_slacks(pattern, afternoon_ids, state).items():
+            for p, value in values.items():
+                slack_val[code][(f'staff_{i}', f'day_{day_id(p)}')] = {"value": float(value), "name": code}
+    for code, variables in s.items():
+        if code in RELAXABLE_CODES and mode == "hard":
+            continue
+        slack_val[code] = {}
+        for key, var in variables.items():
+            label = f'day_{day_id(key)}' if isinstance(key, int) else (f'day_{day_id(key[0])}', key[1])
+            slack_val[code][label] = {"value": float(round(var.solution_value())), "name": code}
+    info["extract_time"] = time.perf_counter() - start
+
+    if mode == "elastic":
+        if hard_slack_used(slack_val):
+            print("Hard-tier slack used, week is infeasible as a hard model")
+        else:
+            print("No hard-tier slack used")
+    return SolveResult(x_val, slack_val, info)
@@ -0,0 +1,179 @@
+from solver_core import build_index, get_model, week_days, hard_slack_used, BACKENDS, WEEKLY_HOURS
+from instance_loader import load_data
+import argparse
+import json
+import time
+
+#Repair re-solve of a published roster after last-minute changes.
+#Every assignment outside a window of days around the changes is fixed, the
+#window is re-optimised with the weekly model (elastic mode) and the cells whose
+#shift changed are reported as churn.
+#
+#Change set entries:
+#  {"kind": "unavailable", "staff": 3, "date": "2019-12-10"}
+#     staff takes the Empty shift that day, the hours of the rostered shift are
+#     taken off the staff's weekly target
+#  {"kind": "coverage", "date": "2019-12-10", "morningShiftCov": 3, "afternoonShiftCov": 2}
+#     new coverage value(s) for that day
+
+
+def load_roster(scheduling_result, scheduling_data):
+    #x_val ((staff, shift, day id) keys) of a scheduling_result.json roster
+    ids = {day["date"]: day["id"] for day in scheduling_data["periods"]}
+    x_val = {}
+    for roster_days in scheduling_result["roster_per_day"]:
+        for cells in roster_days.values():
+            for cell in cells:
+                x_val[(cell["staff"], cell["shift"], ids[cell["day"]])] = 1.0
+    return x_val
+
+
+def apply_changes(scheduling_data, changes):
+    #Copy of scheduling_data with the coverage changes applied, the unavailable
+    #(staff, day id) pairs and the day ids touched by the change set
+    periods = [dict(day) for day in scheduling_data["periods"]]
+    by_date = {day["date"]: day for day in periods}
+    unavailable = set()
+    changed_days = set()
+    for change in changes:
+        day = by_date.get(change["date"])
+        if day is None:
+            raise ValueError(f'Unknown date in change set: {change["date"]}')
+        if change["kind"] == "unavailable":
+            unavailable.add((change["staff"], day["id"]))
+        elif change["kind"] == "coverage":
+            for cov in ("morningShiftCov", "afternoonShiftCov"):
+                if cov in change:
+                    day[cov] = change[cov]
+        else:
+            raise ValueError(f'Unknown change kind: {change["kind"]}')
+        changed_days.add(day["id"])
+    return dict(scheduling_data, periods=periods), unavailable, changed_days
+
+
+def repair_roster(scheduling_data, roster, changes, radius=1, backend="SCIP", time_limit=None):
+    #Returns the repaired x_val and a report with churn, slacks and telemetry per week.
+    #radius is the number of days around each changed day that are re-optimised.
+    start = time.perf_counter()
+    data, unavailable, changed_days = apply_changes(scheduling_data, changes)
+    index = build_index(data["staffs"], data["shifts"])
+    if "Empty" not in index["shifts_list"]:
+        raise ValueError("Unavailable staff need the Empty shift in the shift catalogue")
+    working = set(index["shift_type"].get("morning", []) + index["shift_type"].get("afternoon", []))
+    periods_by_id = {day["id"]: day for day in data["periods"]}
+    assigned = {(i, d): j for (i, j, d), val in roster.items() if val > 0.5}
+
+    x_val = dict(roster)
+    report = {"weeks": {}, "slack_val": {}}
+    for current_week in sorted({periods_by_id[d]["week"] for d in changed_days}):
+        days = week_days(data, current_week)
+        free_days = {day["id"] for day in days
+                     if any(abs(day["id"] - d) <= radius for d in changed_days)}
+
+        #Everything outside the window keeps its shift, kept shifts inside it are rewarded
+        #with less than one soft violation in total
+        fixed = {}
+        hours = {}
+        keep = {}
+        weight = 1 / (len(free_days) * len(index["staffs_list"]) + 1)
+        for i in index["staffs_list"]:
+            for day in days:
+                d = day["id"]
+                j = assigned.get((i, d))
+                if (i, d) in unavailable and j in working:
+                    fixed[(i, "Empty", d)] = 1
+                    hours[(i, 0)] = hours.get((i, 0), WEEKLY_HOURS) - index["duration"][j]
+                elif j is None:
+                    continue
+                elif d in free_days:
+                    keep[(i, j, d)] = weight
+                else:
+                    fixed[(i, j, d)] = 1
+
+        print("---------Repairing ", f'week {current_week}, days {sorted(free_days)}---------')
+        model = get_model(data, days, backend)
+        result = model.solve(days, "elastic", hint=roster, time_limit=time_limit, boundary=x_val,
+                             repair={"fixed": fixed, "hours": hours, "keep": keep})
+        report["weeks"][current_week] = result.info
+        if result[0] is None:
+            print(f'No repaired roster found for week {current_week}, keeping the published one')
+            continue
+        for key in [key for key in x_val if key[2] in model.pos_of_id]:
+            del x_val[key]
+        x_val.update({key: val for key, val in result[0].items() if val > 0.5})
+        report["slack_val"][current_week] = result[1]
+        report["weeks"][current_week]["hard_slack_used"] = hard_slack_used(result[1])
+
+    repaired = {(i, d): j for (i, j, d), val in x_val.items() if val > 0.5}
+    report["churn"] = [{"staff": i, "date": periods_by_id[d]["date"],
+                        "before": assigned.get((i, d)), "after": j}
+                       for (i, d), j in sorted(repaired.items()) if assigned.get((i, d)) != j]
+    report["repair_time"] = time.perf_counter() - start
+    print(f'Repair changed {len(report["churn"])} assignments in {report["repair_time"]:.3f}s')
+    return x_val, report
+
+
+def roster_result(x_val, scheduling_data):
+    #scheduling_result.json structure of a roster, as written by main.py
+    roster_per_day = {}
+    roster_staffs = {f'staff_{staff["id"]}': [] for staff in scheduling_data["staffs"]}
+    weeks = sorted({day["week"] for day in scheduling_data["periods"]})
+    for current_week in weeks:
+        roster_days = {}
+        for day in week_days(scheduling_data, current_week):
+            roster_days[f'day_{day["id"]}'] = []
+            for staff in scheduling_data["staffs"]:
+                i = staff["id"]
+                for shift in scheduling_data["shifts"]:
+                    j = shift["id"]
+                    if x_val.get((i, j, day["id"]), 0) > 0.5:
+                        roster_days[f'day_{day["id"]}'].append({
+                            "day": day["date"],
+                            "week": day["week"],
+                            "staff": i,
+                            "agency": staff["agency"],
+                            "shift": j,
+                        })
+                        roster_staffs[f'staff_{i}'].append({
+                            "date": day["date"],
+                            "week": day["week"],
+                            "day": day["dayOfWeek"],
+                            "dayOfWeek": day["dayOfWeek"],
+                            "dayType": day["dayType"],
+                            "shift": j,
+                        })
+        roster_per_day[current_week] = roster_days
+    #roster_per_staff lists each staff's cells in date order
+    for cells in roster_staffs.values():
+        cells.sort(key=lambda cell: cell["date"])
+    return {"roster_per_day": [roster_per_day[w] for w in weeks],
+            "roster_per_staff": [roster_staffs]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--changes", required=True, help="JSON list of changes")
+    parser.add_argument("--data", default="scheduling_data.json")
+    parser.add_argument("--result", default="result/Q1/scheduling_result.json",
+                        help="published roster to repair")
+    parser.add_argument("--output", default="result/Q1/repaired_result.json")
+    parser.add_argument("--radius", type=int, default=1,
+                        help="days around each change that may be re-rostered")
+    parser.add_argument("--backend", choices=BACKENDS, default="SCIP")
+    parser.add_argument("--time-limit", type=float, default=None)
+    args = parser.parse_args()
+
+    scheduling_data = load_data(args.data)
+    with open(args.result, "r") as f:
+        roster = load_roster(json.load(f), scheduling_data)
+    with open(args.changes, "r") as f:
+        changes = json.load(f)
+
+    x_val, report = repair_roster(scheduling_data, roster, changes, args.radius, args.backend,
+                                  args.time_limit)
+    repaired, _, _ = apply_changes(scheduling_data, changes)
+    result = roster_result(x_val, repaired)
+    result["churn"] = report["churn"]
+    with open(args.output, "w") as json_file:
+        json.dump(result, json_file, indent=4)
+    print("Successfully export repaired roster to json")
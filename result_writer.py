@@ -0,0 +1,128 @@
+from solver_core import hard_slack_used
+import json
+import os
+
+#Result files written week by week while the weeks are solved. Each week is built
+#in one pass over its assigned (staff, shift, day) cells and violated slacks and
+#written out at once, so only the per-staff roster of the json formats is held
+#until the end.
+#  json     scheduling_result.json/violations.json as json.dump(..., indent=4) writes them
+#  compact  same structure without whitespace
+#  ndjson   scheduling_result.ndjson/violations.ndjson, one line per week
+#violations.json maps each week to its slack families, the weeks that needed hard-tier
+#slack are summarised last under "hard_slack_used" ({"week_N": bool}). An ndjson line
+#holds the week, its flag and the families under "violations".
+
+OUTPUT_FORMATS = ["json", "compact", "ndjson"]
+
+
+class ResultWriter:
+
+    def __init__(self, scheduling_data, result_dir="result/Q1", output_format="json"):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f'Unknown output format: {output_format}')
+        self.format = output_format
+        self.staffs = {staff["id"]: staff for staff in scheduling_data["staffs"]}
+        self.staff_pos = {i: n for n, i in enumerate(self.staffs)}
+        self.shift_pos = {shift["id"]: k for k, shift in enumerate(scheduling_data["shifts"])}
+        self.periods = scheduling_data["periods"]
+        #Per-staff roster of all weeks, the json formats write it last
+        self.roster_staffs = {f'staff_{i}': [] for i in self.staffs}
+        self.hard_slack_used = {}
+        self.weeks = 0
+
+        extension = "ndjson" if output_format == "ndjson" else "json"
+        self.roster_path = os.path.join(result_dir, f'scheduling_result.{extension}')
+        self.violations_path = os.path.join(result_dir, f'violations.{extension}')
+        self.roster_file = open(self.roster_path, "w")
+        self.violations_file = open(self.violations_path, "w")
+        if output_format != "ndjson":
+            self.roster_file.write("{" + self.newline(1) + '"roster_per_day"' + self.colon() + "[")
+            self.violations_file.write("{")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def newline(self, level):
+        return "\n" + "    " * level if self.format == "json" else ""
+
+    def colon(self):
+        return ": " if self.format == "json" else ":"
+
+    def dumps(self, obj, level=0):
+        #obj as nested `level` deep in the document
+        if self.format == "json":
+            return json.dumps(obj, indent=4).replace("\n", self.newline(level))
+        return json.dumps(obj, separators=(",", ":"))
+
+    def week_roster(self, x_val, current_week):
+        #roster_per_day entry and per-staff cells of one week
+        days = [day for day in self.periods if day["week"] == current_week]
+        day_pos = {day["id"]: p for p, day in enumerate(days)}
+        cells = sorted((day_pos[d], self.staff_pos[i], self.shift_pos[j], i, j)
+                       for (i, j, d), val in x_val.items() if val > 0.5 and d in day_pos)
+
+        roster_days = {f'day_{day["id"]}': [] for day in days}
+        roster_staffs = {}
+        for p, _, _, i, j in cells:
+            day = days[p]
+            roster_days[f'day_{day["id"]}'].append({
+                "day": day["date"],
+                "week": day["week"],
+                "staff": i,
+                "agency": self.staffs[i]["agency"],
+                "shift": j,
+            })
+            roster_staffs.setdefault(f'staff_{i}', []).append({
+                "date": day["date"],
+                "week": day["week"],
+                "day": day["dayOfWeek"],
+                "dayOfWeek": day["dayOfWeek"],
+                "dayType": day["dayType"],
+                "shift": j,
+            })
+        return roster_days, roster_staffs
+
+    def week_violations(self, slack_val):
+        violations = {}
+        for code, cells in slack_val.items():
+            violations[code] = [{"key": str(key), "slack": info["value"]}
+                                for key, info in cells.items() if info["value"] > 0]
+        return violations
+
+    def write_week(self, current_week, x_val, slack_val):
+        roster_days, roster_staffs = self.week_roster(x_val, current_week)
+        violations = self.week_violations(slack_val)
+        used = hard_slack_used(slack_val)
+        self.hard_slack_used[f'week_{current_week}'] = used
+        if self.format == "ndjson":
+            self.roster_file.write(self.dumps({"week": current_week, "roster_per_day": roster_days,
+                                               "roster_per_staff": roster_staffs}) + "\n")
+            self.violations_file.write(self.dumps({"week": current_week, "hard_slack_used": used,
+                                                   "violations": violations}) + "\n")
+        else:
+            separator = "," if self.weeks else ""
+            self.roster_file.write(separator + self.newline(2) + self.dumps(roster_days, 2))
+            self.violations_file.write(separator + self.newline(1) + json.dumps(f'week_{current_week}')
+                                       + self.colon() + self.dumps(violations, 1))
+            for code, cells in roster_staffs.items():
+                self.roster_staffs[code].extend(cells)
+        self.roster_file.flush()
+        self.violations_file.flush()
+        self.weeks += 1
+
+    def close(self):
+        if self.roster_file.closed:
+            return
+        if self.format != "ndjson":
+            self.roster_file.write((self.newline(1) if self.weeks else "") + "],"
+                                   + self.newline(1) + '"roster_per_staff"' + self.colon()
+                                   + self.dumps([self.roster_staffs], 1) + self.newline(0) + "}")
+            self.violations_file.write(("," if self.weeks else "") + self.newline(1) + '"hard_slack_used"'
+                                       + self.colon() + self.dumps(self.hard_slack_used, 1)
+                                       + self.newline(0) + "}")
+        self.roster_file.close()
+        self.violations_file.close()
@@ -0,0 +1,176 @@
+from solver_core import (build_index, get_model, week_days, BACKENDS, RELAXABLE_CODES,
+                         WEEKLY_HOURS)
+from heuristic import split_hours
+from instance_loader import load_data
+from ortools.linear_solver import linear_solver_pb2
+from ortools.linear_solver import pywraplp
+import argparse
+import json
+import math
+import time
+
+#Pre-solve screening of a week against the hard model. Closed-form capacity
+#checks (staff per day, working shifts the 44 hours allow against the exact
+#coverage, afternoon staff per agency) name the conflicting rule families with
+#their numbers, an LP relaxation probe of the compiled model (GLOP) catches what
+#the arithmetic misses. A week flagged here is infeasible as a hard model, one
+#that passes may still be infeasible once integrality is imposed.
+
+
+def conflict(family, label, required, available, message):
+    #family is a slack family or the family suffix shared by the morning and afternoon ones
+    return {"family": family, "label": label, "required": required, "available": available,
+            "relaxable": any(code.endswith(family) for code in RELAXABLE_CODES), "message": message}
+
+
+def capacity_checks(scheduling_data, current_week):
+    #Conflicts found by arithmetic on the week's inputs alone
+    index = build_index(scheduling_data["staffs"], scheduling_data["shifts"])
+    days = week_days(scheduling_data, current_week)
+    staffs_list = index["staffs_list"]
+    duration = index["duration"]
+    working_ids = [j for j in index["shift_type"].get("morning", []) + index["shift_type"].get("afternoon", [])
+                   if j != "M3"]
+    durations = tuple(sorted({duration[j] for j in working_ids}, reverse=True))
+    holidays = sum(1 for day in days if day["isHoliday"])
+    conflicts = []
+
+    #Working shifts per staff: one DO, PH on holidays, M3 once for half-day staff,
+    #the rest of the 44 hours in full shifts or Empty days
+    shift_range = {}
+    for i in staffs_list:
+        ph_days = holidays if i in index["off_on_ph"] else 0
+        half_day = 1 if i in index["half_day"] else 0
+        free = len(days) - 1 - ph_days - half_day
+        target = WEEKLY_HOURS - ph_days * duration.get("PH", 0) - half_day * duration.get("M3", 0)
+        if free < 0 or target < 0 or split_hours(target, free, durations) is None:
+            conflicts.append(conflict("44_Hours", f'staff_{i}', WEEKLY_HOURS,
+                                      ph_days * duration.get("PH", 0) + max(free, 0) * durations[0],
+                                      f'staff {i} cannot be rostered {WEEKLY_HOURS} hours on {max(free, 0)} '
+                                      f'free days ({ph_days} PH, {half_day} M3)'))
+            continue
+        low = math.ceil(target / durations[0])
+        high = min(free, target // durations[-1])
+        shift_range[i] = (low + half_day, high + half_day)
+
+    #Coverage is exact: the working shifts of all staff equal the coverage of the week
+    needed = sum(day["morningShiftCov"] + day["afternoonShiftCov"] for day in days)
+    fewest = sum(low for low, high in shift_range.values())
+    most = sum(high for low, high in shift_range.values())
+    if needed < fewest:
+        conflicts.append(conflict("General_Cov", f'week_{current_week}', needed, fewest,
+                                  f'{WEEKLY_HOURS}-hour weeks need at least {fewest} working shifts, '
+                                  f'coverage asks for {needed}'))
+    elif needed > most:
+        conflicts.append(conflict("General_Cov", f'week_{current_week}', needed, most,
+                                  f'{WEEKLY_HOURS}-hour weeks allow at most {most} working shifts, '
+                                  f'coverage asks for {needed}'))
+
+    for day in days:
+        present = [i for i in staffs_list if not (day["isHoliday"] and i in index["off_on_ph"])]
+        if day["morningShiftCov"] + day["afternoonShiftCov"] > len(present):
+            conflicts.append(conflict("General_Cov", f'day_{day["id"]}',
+                                      day["morningShiftCov"] + day["afternoonShiftCov"], len(present),
+                                      f'day {day["id"]} needs {day["morningShiftCov"]} + '
+                                      f'{day["afternoonShiftCov"]} staff, {len(present)} are not on PH'))
+
+        #One afternoon per agency, within the exact afternoon coverage
+        if day["afternoonShiftCov"] < len(index["agencies"]):
+            conflicts.append(conflict("Afternoon_Agency_Cov", f'day_{day["id"]}', len(index["agencies"]),
+                                      day["afternoonShiftCov"],
+                                      f'day {day["id"]} has {day["afternoonShiftCov"]} afternoon shifts '
+                                      f'for {len(index["agencies"])} agencies'))
+        for a in index["agencies"]:
+            available = [i for i in index["agency"][a] if i in present]
+            if not available:
+                conflicts.append(conflict("Afternoon_Agency_Cov", (f'day_{day["id"]}', a), 1, 0,
+                                          f'{a} has no staff for the afternoon of day {day["id"]}'))
+    return conflicts
+
+
+def lp_probe(scheduling_data, current_week, backend="SCIP", boundary=None, symmetry=False):
+    #Least relaxable slack of the LP relaxation of the compiled weekly model, per family.
+    #Any slack proves the hard model infeasible.
+    days = week_days(scheduling_data, current_week)
+    model = get_model(scheduling_data, days, backend, symmetry)
+    model.set_week(days, "relaxed", boundary)
+    proto = linear_solver_pb2.MPModelProto()
+    model.solver.ExportModelToProto(proto)
+
+    family = {var.index(): code for code in RELAXABLE_CODES for var in model.s[code].values()}
+    for idx, var in enumerate(proto.variable):
+        var.is_integer = False
+        var.objective_coefficient = 1 if idx in family else 0
+    proto.objective_offset = 0
+    proto.maximize = False
+
+    solver = pywraplp.Solver.CreateSolver("GLOP")
+    if solver.LoadModelFromProto(proto):
+        return {"status": "NOT_SOLVED", "slack": {}}
+    status = solver.Solve()
+    if status != pywraplp.Solver.OPTIMAL:
+        #Infeasible without the relaxable slack: a per-staff rule cannot be met
+        return {"status": "INFEASIBLE" if status == pywraplp.Solver.INFEASIBLE else "NOT_SOLVED",
+                "slack": {}}
+    variables = solver.variables()
+    slack = {}
+    for idx, code in family.items():
+        value = variables[idx].solution_value()
+        if value > 1e-6:
+            slack[code] = slack.get(code, 0.0) + value
+    return {"status": "OPTIMAL", "objective": solver.Objective().Value(), "slack": slack}
+
+
+def screen_week(scheduling_data, current_week, backend="SCIP", boundary=None, lp=True, symmetry=False):
+    #{"infeasible": True when the hard model is proven infeasible, "conflicts": closed-form
+    #conflicts, "lp": LP probe result or None}.
+    #The probe uses the model get_model compiles for the mip engine (symmetry as there).
+    start = time.perf_counter()
+    report = {"week": current_week, "conflicts": capacity_checks(scheduling_data, current_week), "lp": None}
+    report["infeasible"] = bool(report["conflicts"])
+    if lp and not report["infeasible"]:
+        #The probe only runs when arithmetic finds nothing, it costs a model build
+        report["lp"] = lp_probe(scheduling_data, current_week, backend, boundary, symmetry)
+        report["infeasible"] = report["lp"]["status"] == "INFEASIBLE" or bool(report["lp"]["slack"])
+    report["screen_time"] = time.perf_counter() - start
+    return report
+
+
+def format_screening(report):
+    lines = [f'Screening week {report["week"]}: hard model '
+             f'{"infeasible" if report["infeasible"] else "not ruled out"} ({report["screen_time"]:.3f}s)']
+    families = {}
+    for item in report["conflicts"]:
+        families.setdefault(item["family"], []).append(item)
+    for code, items in families.items():
+        tier = "relaxable" if items[0]["relaxable"] else "not relaxable"
+        lines.append(f'  {code} ({tier}): {len(items)} conflict(s), e.g. {items[0]["message"]}')
+    if report["lp"] is not None:
+        lp = report["lp"]
+        if lp["slack"]:
+            lines.append("  LP relaxation needs slack in " +
+                         ", ".join(f'{code} ({value:g})' for code, value in lp["slack"].items()))
+        elif lp["status"] != "OPTIMAL":
+            lines.append(f'  LP relaxation {lp["status"]} even with relaxable slack')
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="scheduling_data.json")
+    parser.add_argument("--backend", choices=BACKENDS, default="SCIP")
+    parser.add_argument("--no-lp", dest="lp", action="store_false",
+                        help="closed-form checks only, no LP relaxation probe")
+    parser.add_argument("--output", default=None, help="write the screening reports to this JSON file")
+    args = parser.parse_args()
+
+    scheduling_data = load_data(args.data)
+
+    reports = []
+    for current_week in sorted({day["week"] for day in scheduling_data["periods"]}):
+        report = screen_week(scheduling_data, current_week, args.backend, lp=args.lp)
+        print(format_screening(report))
+        reports.append(report)
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump(reports, json_file, indent=4)
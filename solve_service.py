@@ -0,0 +1,463 @@
+from main import run_solver
+from solver_core import hard_slack_used, BACKENDS, ENGINES
+from instance_loader import load_data, validate_data
+from result_writer import OUTPUT_FORMATS
+from table_export import TABLE_FORMATS
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+#Batch solving of many scheduling inputs (one per site) on one machine. Jobs are
+#queued on an asyncio queue and run through run_solver in one process per worker,
+#each into its own result directory with its solver output in log.txt. A job that
+#overruns its deadline fails and its process is replaced.
+#JobService is the asyncio API, solve_batch runs a list of inputs to completion
+#and serve exposes the service over HTTP:
+#  POST /jobs                 {"data": scheduling_data, "options": {...}} or a list of
+#                             them, 202 with the job status (400 invalid, 503 queue full)
+#  GET  /jobs                 status of every job
+#  GET  /jobs/<id>            status of one job
+#  GET  /jobs/<id>/events     status lines (NDJSON) streamed until the job finishes
+#  GET  /jobs/<id>/result     weekly summary and result files of a finished job
+#  GET  /jobs/<id>/files/<f>  one result file
+#  GET  /metrics              throughput (rosters per minute), queue latency, solve time
+
+#Options a job may set, with their defaults. time_limit is the budget of the whole
+#job in seconds, split evenly over its weekly solves. The job fails once it runs
+#JOB_TIME_GRACE seconds past it (loading, model builds and writing are not in the
+#solver limits), or after the service job_timeout when it has no time_limit.
+JOB_OPTIONS = {
+    "elastic": True,
+    "backend": "SCIP",
+    "engine": "mip",
+    "time_limit": None,
+    "gap": None,
+    "warm_start": False,
+    "symmetry": False,
+    "output_format": "json",
+    "tables": None,
+}
+
+JOB_STATES = ["queued", "running", "done", "failed"]
+
+DEFAULT_QUEUE_SIZE = 1000
+
+JOB_TIME_GRACE = 60
+DEFAULT_JOB_TIMEOUT = 3600
+
+#Completed jobs counted by the throughput metric, in seconds
+METRICS_WINDOW = 300
+
+#Largest request body accepted over HTTP
+MAX_BODY = 256 * 1024 * 1024
+
+
+def job_options(options):
+    #Options completed with the defaults, ValueError on anything run_solver would reject
+    unknown = set(options or {}) - set(JOB_OPTIONS)
+    if unknown:
+        raise ValueError(f'Unknown job options: {", ".join(sorted(unknown))}')
+    options = dict(JOB_OPTIONS, **(options or {}))
+    if options["backend"] not in BACKENDS:
+        raise ValueError(f'Unknown backend: {options["backend"]}')
+    if options["engine"] not in ENGINES:
+        raise ValueError(f'Unknown engine: {options["engine"]}')
+    if options["output_format"] not in OUTPUT_FORMATS:
+        raise ValueError(f'Unknown output format: {options["output_format"]}')
+    if options["tables"] is not None and not isinstance(options["tables"], list):
+        raise ValueError("tables must be a list of table formats")
+    for table_format in options["tables"] or []:
+        if table_format not in TABLE_FORMATS:
+            raise ValueError(f'Unknown table format: {table_format}')
+    for key in ("elastic", "warm_start", "symmetry"):
+        if not isinstance(options[key], bool):
+            raise ValueError(f'{key} must be true or false')
+    for key in ("time_limit", "gap"):
+        value = options[key]
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f'{key} must be a number')
+    if options["time_limit"] is not None and options["time_limit"] <= 0:
+        raise ValueError("time_limit must be a positive number")
+    #A gap of 0 asks for a proven optimum
+    if options["gap"] is not None and options["gap"] < 0:
+        raise ValueError("gap must be zero or a positive number")
+    return options
+
+
+def run_job(scheduling_data, job_dir, options):
+    #Runs in a pool process: one run_solver call into job_dir, returns the weekly summary
+    os.makedirs(job_dir, exist_ok=True)
+    options = dict(options)
+    weeks = {day["week"] for day in scheduling_data["periods"]}
+    if options["time_limit"] is not None:
+        options["time_limit"] = options["time_limit"] / len(weeks)
+    with open(os.path.join(job_dir, "log.txt"), "w") as log, redirect_stdout(log):
+        results = run_solver(data=scheduling_data, result_dir=job_dir, **options)
+    summary = []
+    for week, result in results.items():
+        summary.append({
+            "week": week,
+            "status": result.status,
+            "objective": result.info.get("objective"),
+            "hard_slack_used": None if result[0] is None else hard_slack_used(result[1]),
+            "solve_time": result.info.get("solve_time"),
+        })
+    return summary
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "max": None}
+    values = sorted(values)
+    pick = lambda q: values[min(int(q * len(values)), len(values) - 1)]
+    return {"count": len(values), "mean": sum(values) / len(values), "p50": pick(0.5), "p95": pick(0.95),
+            "max": values[-1]}
+
+
+def kill_pool(pool):
+    #A running call cannot be cancelled, the pool processes are terminated instead
+    for process in list(pool._processes.values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class JobService:
+
+    def __init__(self, workers=2, output_dir="result/jobs", queue_size=DEFAULT_QUEUE_SIZE,
+                 job_timeout=DEFAULT_JOB_TIMEOUT):
+        self.workers = workers
+        self.output_dir = output_dir
+        self.queue_size = queue_size
+        self.job_timeout = job_timeout
+        self.jobs = {}
+        #Inputs of queued jobs, dropped once the job starts
+        self.inputs = {}
+        #One single-process pool per worker, a stuck job is killed without touching the others
+        self.pools = []
+        self.tasks = []
+        self.started = None
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        self.changed = asyncio.Condition()
+        self.pools = [ProcessPoolExecutor(max_workers=1) for _ in range(self.workers)]
+        self.tasks = [asyncio.create_task(self.worker(slot)) for slot in range(self.workers)]
+        self.started = time.time()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for pool in self.pools:
+            pool.shutdown(cancel_futures=True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def submit(self, scheduling_data, options=None, name=None):
+        return self.submit_many([(scheduling_data, options, name)])[0]
+
+    def submit_many(self, requests):
+        #Validates and queues (scheduling_data, options, name) requests, all or none.
+        #Returns their job statuses. ValueError for invalid input or options,
+        #asyncio.QueueFull when the queue has no room for all of them.
+        requests = [(validate_data(data), job_options(options), name) for data, options, name in requests]
+        if self.queue_size and len(requests) > self.queue_size - self.queue.qsize():
+            raise asyncio.QueueFull()
+        jobs = []
+        for scheduling_data, options, name in requests:
+            job_id = uuid.uuid4().hex[:12]
+            job = {
+                "id": job_id,
+                "name": name,
+                "status": "queued",
+                "options": options,
+                "dir": os.path.join(self.output_dir, job_id),
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+                "queue_latency": None,
+                "run_time": None,
+                "weeks": None,
+                "error": None,
+            }
+            self.queue.put_nowait(job_id)
+            self.jobs[job_id] = job
+            self.inputs[job_id] = scheduling_data
+            jobs.append(dict(job))
+        return jobs
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+    def deadline(self, options):
+        #Wall-clock seconds a job may run before it fails
+        if options["time_limit"] is None:
+            return self.job_timeout
+        return options["time_limit"] + JOB_TIME_GRACE
+
+    async def worker(self, slot):
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id = await self.queue.get()
+            job = self.jobs[job_id]
+            job["status"] = "running"
+            job["started"] = time.time()
+            job["queue_latency"] = job["started"] - job["submitted"]
+            await self.notify()
+            deadline = self.deadline(job["options"])
+            try:
+                job["weeks"] = await asyncio.wait_for(
+                    loop.run_in_executor(self.pools[slot], run_job, self.inputs.pop(job_id), job["dir"],
+                                         job["options"]), deadline)
+                job["status"] = "done"
+            except asyncio.TimeoutError:
+                job["status"] = "failed"
+                job["error"] = f'TimeoutError: job ran past its {deadline:g}s deadline'
+                kill_pool(self.pools[slot])
+                self.pools[slot] = ProcessPoolExecutor(max_workers=1)
+            except BrokenProcessPool as error:
+                #The pool process died (e.g. out of memory): the job fails, later jobs get a new pool
+                job["status"] = "failed"
+                job["error"] = f'BrokenProcessPool: {error}'
+                self.pools[slot].shutdown(wait=False)
+                self.pools[slot] = ProcessPoolExecutor(max_workers=1)
+            except Exception as error:
+                job["status"] = "failed"
+                job["error"] = f'{type(error).__name__}: {error}'
+            job["finished"] = time.time()
+            job["run_time"] = job["finished"] - job["started"]
+            self.queue.task_done()
+            await self.notify()
+
+    async def join(self):
+        #Returns once every submitted job has finished
+        await self.queue.join()
+
+    def status(self, job_id):
+        #Job status or None for an unknown id
+        job = self.jobs.get(job_id)
+        return None if job is None else dict(job)
+
+    async def events(self, job_id):
+        #Yields the job status on every change, last when the job is done or failed
+        last = None
+        while True:
+            #Checked under the lock, a change notified in between is not missed
+            async with self.changed:
+                await self.changed.wait_for(lambda: self.status(job_id) != last)
+                last = self.status(job_id)
+            yield last
+            if last["status"] in ("done", "failed"):
+                return
+
+    async def wait(self, job_id):
+        async for job in self.events(job_id):
+            pass
+        return job
+
+    def result_files(self, job_id):
+        job = self.jobs[job_id]
+        if job["status"] != "done":
+            return []
+        return sorted(name for name in os.listdir(job["dir"]) if name != "log.txt")
+
+    def metrics(self):
+        now = time.time()
+        jobs = list(self.jobs.values())
+        counts = {state: sum(1 for job in jobs if job["status"] == state) for state in JOB_STATES}
+        uptime = now - self.started
+        recent = [job for job in jobs if job["status"] == "done" and job["finished"] >= now - METRICS_WINDOW]
+        window = min(METRICS_WINDOW, uptime)
+        return {
+            "uptime": uptime,
+            "workers": self.workers,
+            "jobs": counts,
+            "rosters_per_minute": len(recent) / window * 60 if window > 0 else 0.0,
+            "rosters_per_minute_total": counts["done"] / uptime * 60 if uptime > 0 else 0.0,
+            "queue_latency": percentiles([job["queue_latency"] for job in jobs if job["queue_latency"] is not None]),
+            "run_time": percentiles([job["run_time"] for job in jobs if job["run_time"] is not None]),
+        }
+
+
+def solve_batch(inputs, workers=2, output_dir="result/jobs", **options):
+    #Solves every input (scheduling_data dict or file path), returns their final job statuses in order
+    async def run():
+        async with JobService(workers, output_dir, queue_size=0) as service:
+            jobs = service.submit_many([(load_data(data), options, data) if isinstance(data, str)
+                                        else (data, options, None) for data in inputs])
+            ids = [job["id"] for job in jobs]
+            await service.join()
+            return [service.status(job_id) for job_id in ids], service.metrics()
+
+    jobs, metrics = asyncio.run(run())
+    return jobs, metrics
+
+
+#HTTP front end, HTTP/1.1 with one request per connection
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+async def send(writer, status, body, content_type="application/json"):
+    if content_type == "application/json":
+        body = json.dumps(body).encode()
+    writer.write(f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: {content_type}\r\n'
+                 f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+    await writer.drain()
+
+
+async def read_request(reader):
+    #(method, path, body), ValueError on a malformed request
+    method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise OverflowError(f'Request body over {MAX_BODY} bytes')
+    body = await reader.readexactly(length) if length else b""
+    return method, urlsplit(target).path, body
+
+
+async def submit_request(service, writer, body):
+    try:
+        request = json.loads(body)
+        requests = request if isinstance(request, list) else [request]
+        #A bare scheduling_data object is a job with the default options
+        requests = [{"data": item} if isinstance(item, dict) and "staffs" in item else item
+                    for item in requests]
+        for item in requests:
+            if not isinstance(item, dict) or "data" not in item:
+                raise ValueError('Each job needs "data" (scheduling_data) and optional "options"')
+        jobs = service.submit_many([(item["data"], item.get("options"), item.get("name")) for item in requests])
+    except asyncio.QueueFull:
+        await send(writer, 503, {"error": "Job queue is full, retry later"})
+        return
+    except ValueError as error:
+        await send(writer, 400, {"error": str(error)})
+        return
+    await send(writer, 202, jobs if isinstance(request, list) else jobs[0])
+
+
+async def stream_events(service, writer, job_id):
+    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n')
+    async for job in service.events(job_id):
+        writer.write(json.dumps(job).encode() + b"\n")
+        await writer.drain()
+
+
+async def route(service, writer, method, path, body):
+    parts = [part for part in path.split("/") if part]
+    if parts == ["metrics"] and method == "GET":
+        return await send(writer, 200, service.metrics())
+    if parts == ["jobs"]:
+        if method == "POST":
+            return await submit_request(service, writer, body)
+        if method == "GET":
+            return await send(writer, 200, [dict(job) for job in service.jobs.values()])
+        return await send(writer, 405, {"error": f'{method} not allowed on /jobs'})
+    if len(parts) < 2 or parts[0] != "jobs" or method != "GET":
+        return await send(writer, 404, {"error": f'No route for {method} {path}'})
+
+    job = service.status(parts[1])
+    if job is None:
+        return await send(writer, 404, {"error": f'Unknown job {parts[1]}'})
+    if len(parts) == 2:
+        return await send(writer, 200, job)
+    if parts[2:] == ["events"]:
+        return await stream_events(service, writer, job["id"])
+    if job["status"] not in ("done", "failed"):
+        return await send(writer, 409, {"error": f'Job {job["id"]} is {job["status"]}', "job": job})
+    if parts[2:] == ["result"]:
+        return await send(writer, 200, dict(job, files=service.result_files(job["id"])))
+    if len(parts) == 4 and parts[2] == "files" and parts[3] in service.result_files(job["id"]):
+        with open(os.path.join(job["dir"], parts[3]), "rb") as f:
+            content = f.read()
+        content_type = "application/json" if parts[3].endswith(".json") else "application/octet-stream"
+        writer.write(f'HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(content)}\r\nConnection: close\r\n\r\n'.encode() + content)
+        return await writer.drain()
+    return await send(writer, 404, {"error": f'No route for {method} {path}'})
+
+
+async def handle(service, reader, writer):
+    try:
+        method, path, body = await read_request(reader)
+        await route(service, writer, method, path, body)
+    except OverflowError as error:
+        await send(writer, 413, {"error": str(error)})
+    except (ValueError, asyncio.IncompleteReadError):
+        await send(writer, 400, {"error": "Malformed request"})
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=8080, workers=2, output_dir="result/jobs",
+                queue_size=DEFAULT_QUEUE_SIZE, job_timeout=DEFAULT_JOB_TIMEOUT):
+    async with JobService(workers, output_dir, queue_size, job_timeout) as service:
+        server = await asyncio.start_server(lambda reader, writer: handle(service, reader, writer),
+                                            host, port)
+        print(f'Serving roster jobs on http://{host}:{port} with {workers} workers')
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="run the HTTP job service")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                              help="queued jobs accepted before submissions are refused")
+    serve_parser.add_argument("--job-timeout", type=float, default=DEFAULT_JOB_TIMEOUT,
+                              help="seconds a job without time_limit may run before it fails")
+    batch_parser = subparsers.add_parser("batch", help="solve the given input files and exit")
+    batch_parser.add_argument("data", nargs="+", help="scheduling_data files, one job each")
+    batch_parser.add_argument("--no-elastic", dest="elastic", action="store_false",
+                              help="solve the hard model first and fall back to the relaxed model")
+    batch_parser.add_argument("--backend", choices=BACKENDS, default="SCIP")
+    batch_parser.add_argument("--engine", choices=ENGINES, default="mip")
+    batch_parser.add_argument("--time-limit", type=float, default=None,
+                              help="time budget per job in seconds, split over its weeks")
+    for subparser in (serve_parser, batch_parser):
+        subparser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                               help="jobs solved in parallel, one process each")
+        subparser.add_argument("--output-dir", default="result/jobs",
+                               help="result files are written to <output-dir>/<job id>/")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port, args.workers, args.output_dir, args.queue_size,
+                          args.job_timeout))
+    else:
+        jobs, metrics = solve_batch(args.data, args.workers, args.output_dir, elastic=args.elastic,
+                                    backend=args.backend, engine=args.engine, time_limit=args.time_limit)
+        for job in jobs:
+            objectives = ", ".join(f'{week["objective"]:g}' if week["objective"] is not None else week["status"]
+                                   for week in job["weeks"] or [])
+            print(f'{job["name"]}: {job["status"]} in {job["run_time"]:.3f}s -> {job["dir"]} '
+                  f'({job["error"] or objectives})')
+        print(f'{metrics["jobs"]["done"]} rosters, {metrics["rosters_per_minute_total"]:.1f} per minute, '
+              f'queue latency p50 {metrics["queue_latency"]["p50"]:.3f}s '
+              f'p95 {metrics["queue_latency"]["p95"]:.3f}s')
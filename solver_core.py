@@ -1,430 +1,1045 @@
+from collections import OrderedDict
+import json
+import time
+
+import numpy as np
+
+from ortools.linear_solver import linear_solver_pb2
 from ortools.linear_solver import pywraplp
 
+from disk_cache import cache_key, cache_load, cache_store
 
-def hard_solve(scheduling_data, current_week):
-    solver = pywraplp.Solver.CreateSolver('SCIP')
+#Slack families that only exist in the relaxed model (hard rows in hard_solve)
+RELAXABLE_CODES = ["+AM_General_Cov", "-AM_General_Cov",
+                   "+PM_General_Cov", "-PM_General_Cov",
+                   "Afternoon_Agency_Cov"]
 
-    #Define sets and indices
-    staffs = scheduling_data["staffs"]
-    shifts = scheduling_data["shifts"]
-    period = scheduling_data["periods"]
-    current_week = current_week
+#Objective weight of relaxable slack in the elastic model, large enough that
+#no amount of soft violations is traded for a hard one
+HARD_PENALTY = 1000
 
-    staffs_list = [staff["id"] for staff in staffs]
-    slack = []
-    shifts_list = [shift["id"] for shift in shifts]
-    days = [day for day in period 
-                 if day["week"] == current_week]
-    days_list = [day["dayOfWeek"] 
-                 for day in days]
-
-    #Define parameters
-    agency_list = ["agency_1", "agency_2", "agency_3"]
-    week_start_idx = 0
-    week_last_idx = 6
-
-    #Define decision variables
-    x = {(i,j,k): solver.IntVar(0.0, 1.0, f'x_{i}_{j}_{k}') 
-                                 for i in staffs_list
-                                 for j in shifts_list
-                                 for k in days_list}
-    
-    s = {}
-    
-    actual_WH = {i: solver.IntVar(0.0, solver.infinity(), f'ActualWH_{i}') for i in staffs_list}
-
-    #Define set of constraints
-    #Each staff works exactly one shift per day (hard)
-    for k in days_list:
-        for i in staffs_list:
-            solver.Add(solver.Sum(x[(i,j,k)] for j in shifts_list) == 1)
+#Slack families over consecutive days, the slack of (staff, position p) covers a pair
+#or triple that ends on position p + 1
+CROSS_DAY_CODES = ["DO-AM_shifts", "PH-AM_shifts", "3AM_shifts"]
 
-    #Each staff takes 1 DO per week (hard)
-    for i in staffs_list:
-            solver.Add(solver.Sum(x[(i,"DO",k)] for k in days_list) == 1)
+#Model variants: hard (relaxable slack fixed to 0), relaxed (all slack weighted 1)
+#and elastic (relaxable slack weighted HARD_PENALTY)
+SOLVE_MODES = ["hard", "relaxed", "elastic"]
 
-    #Assign PH shift to staff whho needs it (hard)
-    for staff in staffs:
-        for day in days:
-            if staff["alwaysOffOnPH"] and day["isHoliday"]:
-                    solver.Add(x[(staff["id"], "PH", day["dayOfWeek"])] == 1)
-            else:
-                solver.Add(x[(staff["id"], "PH", day["dayOfWeek"])] == 0)
+#Share of a week's time_limit the hard attempt may use, the relaxed fallback gets the
+#rest. Solver limits never go below MIN_SOLVE_TIME seconds.
+HARD_SHARE = 0.5
+MIN_SOLVE_TIME = 0.1
+
+#Contracted working hours per staff and week
+WEEKLY_HOURS = 44
+
+#Solver engines the weekly model can be emitted to through pywraplp
+BACKENDS = ["SCIP", "CBC", "CP_SAT"]
+
+#Weekly solve methods: per-staff MIP, pattern-based model, LNS over the MIP,
+#greedy construction without solver
+ENGINES = ["mip", "pattern", "lns", "greedy"]
+
+STATUS_NAMES = {
+    pywraplp.Solver.OPTIMAL: "OPTIMAL",
+    pywraplp.Solver.FEASIBLE: "FEASIBLE",
+    pywraplp.Solver.INFEASIBLE: "INFEASIBLE",
+    pywraplp.Solver.UNBOUNDED: "UNBOUNDED",
+    pywraplp.Solver.ABNORMAL: "ABNORMAL",
+    pywraplp.Solver.MODEL_INVALID: "MODEL_INVALID",
+    pywraplp.Solver.NOT_SOLVED: "NOT_SOLVED",
+}
+
+#Number of compiled models kept alive per process
+MODEL_CACHE_SIZE = 8
+_model_cache = OrderedDict()
+
+#Bumped whenever RosterModel rows change, invalidates compiled models on disk
+MODEL_FORMAT = 5
+
+#SCIP keeps the hint of every solve as a partial solution and fails once it holds
+#this many, the model is reloaded into a fresh solver before that
+SCIP_HINT_LIMIT = 10
+
+
+class SolveResult(tuple):
+    #(x_val, slack_val) pair, unpacks like the plain tuple returned before.
+    #Run information is attached in .info: hint usage, time per phase (build,
+    #setup, solve, extract), solver telemetry (wall time, nodes, iterations,
+    #bound, gap) and model size
+
+    def __new__(cls, x_val, slack_val, info=None):
+        result = tuple.__new__(cls, (x_val, slack_val))
+        result.info = info if info is not None else {}
+        return result
+
+    def __getnewargs__(self):
+        return (self[0], self[1], self.info)
+
+    @property
+    def status(self):
+        return self.info.get("status")
 
-    #Achive 0.5 working days per week for staff who needs it (hard)
+    @property
+    def objective(self):
+        return self.info.get("objective")
+
+    @property
+    def gap(self):
+        return self.info.get("gap")
+
+
+def solve_params(solver, time_limit=None, gap=None, mode=None):
+    #time_limit in seconds and relative gap tolerance, None for no limit.
+    #Always set, a reused solver keeps the previous limit otherwise.
+    #Without a gap the elastic model is solved to a zero gap: with HARD_PENALTY per
+    #hard-tier unit the default relative gap (1e-4) already covers whole soft
+    #violations once 10 or more hard-tier units are used.
+    solver.SetTimeLimit(int(time_limit * 1000) if time_limit else 0)
+    params = pywraplp.MPSolverParameters()
+    if gap is None and mode == "elastic":
+        gap = 0.0
+    if gap is not None:
+        params.SetDoubleParam(pywraplp.MPSolverParameters.RELATIVE_MIP_GAP, gap)
+    return params
+
+
+def solver_telemetry(solver, status, nonzeros=None):
+    telemetry = {
+        "status": STATUS_NAMES.get(status, str(status)),
+        "nodes": solver.nodes(),
+        "iterations": solver.iterations(),
+        "model_size": {
+            "variables": solver.NumVariables(),
+            "constraints": solver.NumConstraints(),
+            "nonzeros": nonzeros,
+        },
+    }
+    if status in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE):
+        objective = solver.Objective().Value()
+        bound = solver.Objective().BestBound()
+        telemetry["objective"] = objective
+        telemetry["best_bound"] = bound
+        telemetry["gap"] = abs(objective - bound) / max(abs(objective), 1e-9) if objective else 0.0
+    return telemetry
+
+
+def build_index(staffs, shifts):
+    #Lookups used by the constraint builders so no row re-scans staffs or shifts
+    index = {
+        "staffs_list": [staff["id"] for staff in staffs],
+        "shifts_list": [shift["id"] for shift in shifts],
+        "duration": {shift["id"]: shift["duration"] for shift in shifts},
+        "shift_type": {},
+        "agency": {},
+        "half_day": set(),
+        "off_on_ph": set(),
+    }
+    for shift in shifts:
+        index["shift_type"].setdefault(shift["shiftType"], []).append(shift["id"])
     for staff in staffs:
-         if staff["desiredHalfDayShift"]:
-              solver.Add(solver.Sum(x[(staff["id"],"M3",k)] for k in days_list) == 1)
-                        
-    #Undesired 0.5 working days per week for staffs who do NOT need it (hard)
+        index["agency"].setdefault(staff["agency"], []).append(staff["id"])
+        if staff["desiredHalfDayShift"]:
+            index["half_day"].add(staff["id"])
+        if staff["alwaysOffOnPH"]:
+            index["off_on_ph"].add(staff["id"])
+    #Agencies with coverage requirements: every agency staff belong to, so no
+    #coverage row is built over a name the data does not use
+    index["agencies"] = sorted(index["agency"])
+    return index
+
+
+def staff_classes(staffs):
+    #Interchangeable staff: same agency and profile flags, no rule tells them apart.
+    #{(agency, alwaysOffOnPH, desiredHalfDayShift, fixedShiftGroup): [staff ids]} in staffs order
+    classes = {}
     for staff in staffs:
-         if not staff["desiredHalfDayShift"]:
-            solver.Add(solver.Sum(x[(staff["id"],"M3",k)] for k in days_list) == 0)
-
-    #Calculate actual working hours for each staff (axiliary)
-    for i in staffs_list:
-        solver.Add(actual_WH[i] == solver.Sum(x[(i,shift["id"],k)]*shift["duration"] 
-                                    for shift in shifts 
-                                    for k in days_list))
-
-
-    #Each staff must work exactly 44 hours per week (hard)
-    for i in staffs_list:
-         solver.Add(actual_WH[i] == 44)
-
-    #Undesire afternoon shift after shift DO (soft)
-    code = "DO-AM_shifts"
-    s[code] = {}
-
-    for i in staffs_list:
-         for k in days_list:
-              if k != week_last_idx:
-                v = solver.IntVar(0, solver.infinity(), f'{code}')
-                s[code][(f'staff_{i}',f'day_{k}')] = v
-                solver.Add(x[(i,"DO",k)] 
-                           + solver.Sum(x[(i,shift["id"],k+1)] 
-                                        for shift in shifts if shift["shiftType"] == "afternoon")
-                            <= 1 + v)
+        key = (staff["agency"], staff["alwaysOffOnPH"], staff["desiredHalfDayShift"],
+               staff["fixedShiftGroup"])
+        classes.setdefault(key, []).append(staff["id"])
+    return classes
+
+
+def horizon_layout(days):
+    #Week offset of every day of the horizon, the only structure the model depends on
+    return tuple(day["week"] - days[0]["week"] for day in days)
+
+
+class RosterModel:
+    #Roster model over a horizon of consecutive days, compiled once per
+    #staff/shift/horizon layout. Variables are indexed by position in the horizon
+    #and reported by the periods day id of the days being solved.
+    #Horizon specific data (coverage, PH days, solve mode, the roster committed
+    #before the horizon) is applied by updating bounds before each solve instead
+    #of rebuilding the model.
+    #symmetry adds rows ordering interchangeable staff by the day of their first-week
+    #DO, lifted for solves where staff are told apart by a boundary roster or a repair.
+    #Shift variables are stored densely: x[x_index(i, j, p)], created first so the flat
+    #offset is also the solver's variable index and solutions are read as one array.
+    #names=False leaves variables unnamed, saving a formatted string per variable.
+
+    def __init__(self, staffs, shifts, layout, backend="SCIP", num_threads=None, symmetry=False,
+                 names=True):
+        build_start = time.perf_counter()
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown solver backend: {backend}')
+        solver = pywraplp.Solver.CreateSolver(backend)
+        if solver is None:
+            raise RuntimeError(f'Solver backend {backend} is not available in this OR-Tools build')
+        if num_threads:
+            solver.SetNumThreads(num_threads)
+        self.solver = solver
+        self.backend = backend
+        self.num_threads = num_threads
+        self.staffs = staffs
+        self.shifts = shifts
+        self.layout = tuple(layout)
+        self.symmetry = symmetry
+
+        #Define sets and indices
+        index = build_index(staffs, shifts)
+        self.index = index
+        self.staff_pos = {i: n for n, i in enumerate(index["staffs_list"])}
+        self.shift_pos = {j: k for k, j in enumerate(index["shifts_list"])}
+        self.x_shape = (len(self.staff_pos), len(self.shift_pos), len(self.layout))
+        self.solve_count = 0
+        self.hinted_solves = 0
+        #Bound/coefficient changes of a repair solve, undone by the next set_week
+        self.overrides = []
+
+        #A model compiled by an earlier run is loaded from the on-disk cache
+        disk_key = cache_key("RosterModel", MODEL_FORMAT, staffs, shifts, self.layout, backend, symmetry,
+                             names)
+        data = cache_load("model", disk_key)
+        if data is not None and self.restore(data):
+            self.from_disk = True
+            self.build_time = time.perf_counter() - build_start
+            return
+        self.from_disk = False
+
+        staffs_list = index["staffs_list"]
+        shifts_list = index["shifts_list"]
+        morning_ids = index["shift_type"].get("morning", [])
+        afternoon_ids = index["shift_type"].get("afternoon", [])
+        duration = index["duration"]
+        positions = list(range(len(self.layout)))
+        weeks = {}
+        for p, week in enumerate(self.layout):
+            weeks.setdefault(week, []).append(p)
+        slack = []
+
+        #Define parameters
+        agency_list = index["agencies"]
+        last_pos = len(positions) - 1
+
+        #Define decision variables
+        x = [solver.IntVar(0.0, 1.0, f'x_{i}_{j}_{p}' if names else "")
+             for i in staffs_list
+             for j in shifts_list
+             for p in positions]
+        xi = self.x_index
+
+        s = {}
+        self.rows = {}
+        self.stats = {"rows": {}, "duplicates": 0, "dominated": 0}
+        add_row = self.add_row
+
+        actual_WH = {(i,w): solver.IntVar(0.0, solver.infinity(), f'ActualWH_{i}_{w}' if names else "")
+                     for i in staffs_list for w in weeks}
+
+        #Reusable morning/afternoon terms per (staff, day)
+        morning = {(i,p): [(x[xi(i,j,p)], 1) for j in morning_ids]
+                   for i in staffs_list for p in positions}
+        afternoon = {(i,p): [(x[xi(i,j,p)], 1) for j in afternoon_ids]
+                     for i in staffs_list for p in positions}
+
+        #Define set of constraints
+        #Each staff works exactly one shift per day (hard)
+        for p in positions:
+            for i in staffs_list:
+                add_row("One_Shift_Per_Day", 1, 1, [(x[xi(i,j,p)], 1) for j in shifts_list])
+
+        #Each staff takes 1 DO per week (hard)
+        for w, week_pos in weeks.items():
+            for i in staffs_list:
+                add_row("One_DO_Per_Week", 1, 1, [(x[xi(i,"DO",p)], 1) for p in week_pos])
+
+        #Assign PH shift to staff who needs it (hard) => bounds set per horizon
+
+        #Achive 0.5 working days per week for staff who needs it (hard)
+        for w, week_pos in weeks.items():
+            for i in index["half_day"]:
+                add_row("Half_Day_Shift", 1, 1, [(x[xi(i,"M3",p)], 1) for p in week_pos])
+
+        #Undesired 0.5 working days per week for staffs who do NOT need it (hard)
+        for w, week_pos in weeks.items():
+            for i in staffs_list:
+                if i not in index["half_day"]:
+                    add_row("Half_Day_Shift", 0, 0, [(x[xi(i,"M3",p)], 1) for p in week_pos])
+
+        #Calculate actual working hours for each staff (axiliary)
+        for w, week_pos in weeks.items():
+            for i in staffs_list:
+                add_row("Working_Hours", 0, 0, [(actual_WH[(i,w)], -1)]
+                                                 + [(x[xi(i,j,p)], duration[j]) for j in shifts_list for p in week_pos])
+
+        #Each staff must work exactly 44 hours per week (hard)
+        hours_rows = {}
+        for w in weeks:
+            for i in staffs_list:
+                hours_rows[(i,w)] = add_row("44_Hours", WEEKLY_HOURS, WEEKLY_HOURS, [(actual_WH[(i,w)], 1)])
+
+        #Cross-day rules also cover the day before the horizon (position -1) through
+        #boundary rows whose right-hand side carries the roster committed before it.
+        #Without a committed roster these rows are slack-free by construction.
+        boundary_rows = {"DO": {}, "PH": {}, "3AM_prev": {}, "3AM_first": {}}
+
+        #Undesire afternoon shift after shift DO (soft)
+        #Undesire afternoon shift after shift PH (soft)
+        for code, j_off, rows in [("DO-AM_shifts", "DO", boundary_rows["DO"]),
+                                  ("PH-AM_shifts", "PH", boundary_rows["PH"])]:
+            s[code] = {}
+            for i in staffs_list:
+                v = solver.IntVar(0, solver.infinity(), f'{code}_{i}_prev' if names else "")
+                s[code][(i,-1)] = v
+                rows[i] = add_row(code, -solver.infinity(), 1, [(v, -1)] + afternoon[(i,0)])
+                slack.append(v)
+                for p in positions:
+                    if p != last_pos:
+                        v = solver.IntVar(0, solver.infinity(), f'{code}_{i}_{p}' if names else "")
+                        s[code][(i,p)] = v
+                        add_row(code, -solver.infinity(), 1, [(x[xi(i,j_off,p)], 1), (v, -1)] + afternoon[(i,p+1)])
+                        slack.append(v)
+
+        #Undesire 3 consecutive afternoon shifts (soft)
+        code = "3AM_shifts"
+        s[code] = {}
+
+        for i in staffs_list:
+            v = solver.IntVar(0, solver.infinity(), f'{code}_{i}_prev' if names else "")
+            s[code][(i,-1)] = v
+            boundary_rows["3AM_prev"][i] = add_row(code, -solver.infinity(), 2, [(v, -1)] + afternoon[(i,0)])
+            slack.append(v)
+            for p in positions:
+                if p == 0 and last_pos > 0:
+                    v = solver.IntVar(0, solver.infinity(), f'{code}_{i}_{p}' if names else "")
+                    s[code][(i,p)] = v
+                    boundary_rows["3AM_first"][i] = add_row(code, -solver.infinity(), 2,
+                                                            [(v, -1)] + afternoon[(i,0)] + afternoon[(i,1)])
+                    slack.append(v)
+                elif 0 < p < last_pos:
+                    v = solver.IntVar(0, solver.infinity(), f'{code}_{i}_{p}' if names else "")
+                    s[code][(i,p)] = v
+                    add_row(code, -solver.infinity(), 2, [(v, -1)] + afternoon[(i,p-1)]
+                                                        + afternoon[(i,p)] + afternoon[(i,p+1)])
+                    slack.append(v)
+
+        #Morning/afternoon shift coverage requirement (hard, relaxable)
+        #Right-hand sides are set per horizon, slack upper bounds decide hard or relaxed.
+        #Relaxable slacks are continuous (integral at the optimum anyway) because SCIP
+        #turns an integer variable fixed at 0 into a binary that cannot be reopened.
+        cov_rows = {}
+        for shift_type, per_staff, code_1, code_2 in [
+                ("morning", morning, "+AM_General_Cov", "-AM_General_Cov"),
+                ("afternoon", afternoon, "+PM_General_Cov", "-PM_General_Cov")]:
+            s[code_1] = {}
+            s[code_2] = {}
+            cov_rows[shift_type] = []
+            for p in positions:
+                v_add = solver.NumVar(0.0, solver.infinity(), f'{code_1}_{p}' if names else "")
+                s[code_1][p] = v_add
+                v_minus = solver.NumVar(0.0, solver.infinity(), f'{code_2}_{p}' if names else "")
+                s[code_2][p] = v_minus
+
+                row = add_row(code_1[1:], 0, 0, [term for i in staffs_list for term in per_staff[(i,p)]]
+                                                      + [(v_add, -1), (v_minus, 1)])
+                cov_rows[shift_type].append(row)
+                slack.append(v_add)
+                slack.append(v_minus)
+
+        #Morning Agency coverage requirement (soft)
+        code = "Morning_Agency_Cov"
+        s[code] = {}
+        for p in positions:
+            for a in agency_list:
+                v = solver.IntVar(0, solver.infinity(), f'{code}_{p}_{a}' if names else "")
+                s[code][(p,a)] = v
+                add_row(code, 1, solver.infinity(), [(v, 1)] + [term for i in index["agency"][a]
+                                                                      for term in morning[(i,p)]])
                 slack.append(v)
-    
-    #Undesire afternoon shift after shift PH (soft)    
-    code = "PH-AM_shifts"
-    s[code] = {}
-
-    for i in staffs_list:
-         for k in days_list:
-              if k != week_last_idx:
-                v = solver.IntVar(0, solver.infinity(), f'{code}')
-                s[code][(f'staff_{i}',f'day_{k}')] = v
-                for shift in shifts:
-                    if shift["shiftType"] == "afternoon":
-                            solver.Add(x[(i,"PH",k)] + solver.Sum(x[(i,shift["id"],k+1)]
-                                                         for shift in shifts if shift["shiftType"] == "afternoon") 
-                                                         <= 1 + v)
+
+        #Afternoon Agency coverage requirement (hard, relaxable)
+        code = "Afternoon_Agency_Cov"
+        s[code] = {}
+        for p in positions:
+            for a in agency_list:
+                v = solver.NumVar(0, solver.infinity(), f'{code}_{p}_{a}' if names else "")
+                s[code][(p,a)] = v
+                add_row(code, 1, solver.infinity(), [(v, 1)] + [term for i in index["agency"][a]
+                                                                      for term in afternoon[(i,p)]])
                 slack.append(v)
 
-    #Undesire 3 consecutive afternoon shifts (soft)
-    code = "3AM_shifts"
-    s[code] = {}
-    
-    for i in staffs_list:
-         for k in days_list:
-              if k not in [week_start_idx, week_last_idx]:
-                   v = solver.IntVar(0, solver.infinity(), f'{code}')
-                   s[code][(f'staff_{i}',f'day_{k}')] = v
-
-                   day_0 =  solver.Sum(x[(i,shift["id"],k-1)] 
-                                for shift in shifts if shift["shiftType"] == "afternoon")   
-
-                   day_1 =  solver.Sum(x[(i,shift["id"],k)] 
-                                for shift in shifts if shift["shiftType"] == "afternoon")
-
-                   day_2 = solver.Sum(x[(i,shift["id"],k+1)] 
-                                for shift in shifts if shift["shiftType"] == "afternoon")   
-
-                   solver.Add(day_0 + day_1 + day_2 <= 2 + v)
-                   slack.append(v)
-    
-    #Morning shift coverage requirement (hard)
-    for day in days:
-         solver.Add(solver.Sum(x[(i,shift["id"],day["dayOfWeek"])] 
-                        for i in staffs_list for shift in shifts if shift["shiftType"] == "morning")
-                    == day["morningShiftCov"])     
-
-    #Afternoon shift coverage requirement(hard)
-    for day in days:
-         solver.Add(solver.Sum(x[(i,shift["id"],day["dayOfWeek"])] 
-                        for i in staffs_list for shift in shifts if shift["shiftType"] == "afternoon")
-                    == day["afternoonShiftCov"])  
-
-    #Morning Agency coverage requirement (soft)    
-    code = "Morning_Agency_Cov"
-    s[code] = {}
-    for k in days_list:
-        for a in agency_list:
-             v = solver.IntVar(0, solver.infinity(), f'{code}')
-             s[code][(f'day_{k}',a)] = v
-             solver.Add(solver.Sum(x[(staff["id"],shift["id"],k)]
-                            for staff in staffs if staff["agency"] == a
-                            for shift in shifts if shift["shiftType"] == "morning")
-                              >= 1 - v)
-             slack.append(v)
-                        
-
-    #Afternoon Agency coverage requirement (hard)
-    for k in days_list:
-        for a in agency_list:
-             solver.Add(solver.Sum(x[(staff["id"],shift["id"],k)]
-                            for staff in staffs if staff["agency"] == a
-                            for shift in shifts if shift["shiftType"] == "afternoon")
-                              >= 1)
-    
-    #Define objective function
-    solver.Minimize(solver.Sum(slack))
-
-    status = solver.Solve()
-    if status == pywraplp.Solver.OPTIMAL:
-        print("Find optimal solution!")
-        print(f'Objective value = {solver.Objective().Value()}')
-        x_val = {
-               key: var.solution_value()
-               for key, var in x.items()
-               }
-        slack_val = {}
+        #Symmetry breaking (optional): within a class each staff takes the first-week DO
+        #no earlier than the next one. Any roster maps onto one that satisfies it by
+        #handing the weekly patterns out in decreasing order of DO day.
+        #Full lexicographic ordering of the patterns needs weights up to 7 * 8^6 per
+        #term, which stalls the LP, the DO day is the ordering key with small weights.
+        symmetry_rows = []
+        if symmetry:
+            first_week = weeks[min(weeks)]
+            for members in staff_classes(staffs).values():
+                for a, b in zip(members, members[1:]):
+                    symmetry_rows.append(add_row("Symmetry", 0, solver.infinity(),
+                        [(x[xi(a,"DO",p)], n) for n, p in enumerate(first_week) if n]
+                        + [(x[xi(b,"DO",p)], -n) for n, p in enumerate(first_week) if n]))
+
+        #Define objective function
+        objective = solver.Objective()
+        for v in slack:
+            objective.SetCoefficient(v, 1)
+        objective.SetMinimization()
 
+        #Model size per variable family
+        self.stats["variables"] = {"x": len(x), "ActualWH": len(actual_WH)}
         for code in s:
-             slack_val[code] = {}
-             for key, var in s[code].items():
-                  slack_val[code][key] = {
-                       "value": var.solution_value(),
-                       "name": var.name()
-                    }
-        return x_val, slack_val
+            self.stats["variables"][code] = len(s[code])
+        self.rows = None
 
-    elif status == pywraplp.Solver.INFEASIBLE:
-        print('Infeasible solution!')
-        return None, None
-        
-    else:
-         print("Solver can not find any optimal solution!")
-         return None, None
-
-def relaxed_solve(scheduling_data, current_week):
-    solver = pywraplp.Solver.CreateSolver('SCIP')
-
-    #Define sets and indices
-    staffs = scheduling_data["staffs"]
-    shifts = scheduling_data["shifts"]
-    period = scheduling_data["periods"]
-    current_week = current_week
-
-    staffs_list = [staff["id"] for staff in staffs]
-    slack = []
-    shifts_list = [shift["id"] for shift in shifts]
-    days = [day for day in period 
-                 if day["week"] == current_week]
-    days_list = [day["dayOfWeek"] 
-                 for day in days]
-
-    #Define parameters
-    agency_list = ["agency_1", "agency_2", "agency_3"]
-    week_start_idx = 0
-    week_last_idx = 6
-
-    #Define decision variables
-    x = {(i,j,k): solver.IntVar(0.0, 1.0, f'x_{i}_{j}_{k}') 
-                                 for i in staffs_list
-                                 for j in shifts_list
-                                 for k in days_list}
-    
-    s = {}
-    
-    actual_WH = {i: solver.IntVar(0.0, solver.infinity(), f'ActualWH_{i}') for i in staffs_list}
-
-    #Define set of constraints
-    #Each staff works exactly one shift per day (hard) => keep
-    for k in days_list:
-        for i in staffs_list:
-            solver.Add(solver.Sum(x[(i,j,k)] for j in shifts_list) == 1)
+        self.x = x
+        self.s = s
+        self.slack_index()
+        self.actual_WH = actual_WH
+        self.weeks = weeks
+        self.cov_rows = cov_rows
+        self.boundary_rows = boundary_rows
+        self.hours_rows = hours_rows
+        self.symmetry_rows = symmetry_rows
 
-    #Each staff takes 1 DO per week (hard) => keep
-    for i in staffs_list:
-            solver.Add(solver.Sum(x[(i,"DO",k)] for k in days_list) == 1)
+        cache_store("model", disk_key, self.dump())
+        self.build_time = time.perf_counter() - build_start
 
-    #Assign PH shift to staff whho needs it (hard) => keep
-    for staff in staffs:
-        for day in days:
-            if staff["alwaysOffOnPH"] and day["isHoliday"]:
-                    solver.Add(x[(staff["id"], "PH", day["dayOfWeek"])] == 1)
+    def dump(self):
+        #Compiled model as MPModelProto plus the index of every variable/row the
+        #model keeps a handle on, as stored in the on-disk cache
+        proto = linear_solver_pb2.MPModelProto()
+        self.solver.ExportModelToProto(proto)
+        meta = {
+            "x": len(self.x),
+            "actual_WH": [[i, w, var.index()] for (i, w), var in self.actual_WH.items()],
+            "s": {code: [[key, var.index()] for key, var in variables.items()]
+                  for code, variables in self.s.items()},
+            "weeks": [[w, week_pos] for w, week_pos in self.weeks.items()],
+            "cov_rows": {shift_type: [row.index() for row in rows]
+                         for shift_type, rows in self.cov_rows.items()},
+            "boundary_rows": {name: [[i, row.index()] for i, row in rows.items()]
+                              for name, rows in self.boundary_rows.items()},
+            "hours_rows": [[i, w, row.index()] for (i, w), row in self.hours_rows.items()],
+            "symmetry_rows": [row.index() for row in self.symmetry_rows],
+            "stats": self.stats,
+        }
+        meta = json.dumps(meta).encode()
+        return len(meta).to_bytes(8, "little") + meta + proto.SerializeToString()
+
+    def reload(self):
+        #Same model in a fresh solver, bounds set per horizon are applied again by set_week
+        for setter, args in reversed(self.overrides):
+            setter(*args)
+        self.overrides = []
+        self.restore(self.dump())
+        self.hinted_solves = 0
+
+    def restore(self, data):
+        #Inverse of dump, False when the entry cannot be loaded
+        try:
+            meta_len = int.from_bytes(data[:8], "little")
+            meta = json.loads(data[8:8 + meta_len])
+            proto = linear_solver_pb2.MPModelProto()
+            proto.ParseFromString(data[8 + meta_len:])
+        except ValueError:
+            return False
+        #Loaded into a fresh solver so a failed load leaves nothing behind
+        solver = pywraplp.Solver.CreateSolver(self.backend)
+        if solver.LoadModelFromProto(proto):
+            return False
+        if self.num_threads:
+            solver.SetNumThreads(self.num_threads)
+        self.solver = solver
+        variables = solver.variables()
+        constraints = solver.constraints()
+        key = lambda k: tuple(k) if isinstance(k, list) else k
+        self.x = variables[:meta["x"]]
+        self.actual_WH = {(i, w): variables[idx] for i, w, idx in meta["actual_WH"]}
+        self.s = {code: {key(k): variables[idx] for k, idx in entries}
+                  for code, entries in meta["s"].items()}
+        self.weeks = {w: week_pos for w, week_pos in meta["weeks"]}
+        self.cov_rows = {shift_type: [constraints[idx] for idx in rows]
+                         for shift_type, rows in meta["cov_rows"].items()}
+        self.boundary_rows = {name: {i: constraints[idx] for i, idx in rows}
+                              for name, rows in meta["boundary_rows"].items()}
+        self.hours_rows = {(i, w): constraints[idx] for i, w, idx in meta["hours_rows"]}
+        self.symmetry_rows = [constraints[idx] for idx in meta["symmetry_rows"]]
+        self.stats = meta["stats"]
+        self.rows = None
+        self.slack_index()
+        return True
+
+    def x_index(self, i, j, p):
+        #Flat offset of the (staff, shift, horizon position) variable
+        return (self.staff_pos[i] * self.x_shape[1] + self.shift_pos[j]) * self.x_shape[2] + p
+
+    def slack_index(self):
+        #Keys and solver indices of every slack family, for bulk extraction
+        self.slack_keys = {code: (list(variables), np.array([var.index() for var in variables.values()],
+                                                            dtype=np.int64))
+                           for code, variables in self.s.items()}
+
+    def add_row(self, family, lb, ub, terms):
+        #Rows are emitted term by term, the natural expression API dominates build time.
+        #A row with the same coefficients as an earlier one is collapsed into it:
+        #identical bounds make it a duplicate, otherwise the tighter bounds are kept.
+        #Variables are keyed by their Python proxy, every variable is kept alive in self.x/self.s
+        coefs = {id(var): coef for var, coef in terms}
+        if len(coefs) != len(terms):
+            #Repeated variable, add up its coefficients
+            coefs = {}
+            for var, coef in terms:
+                coefs[id(var)] = coefs.get(id(var), 0) + coef
+            seen = set()
+            terms = [(var, coefs[id(var)]) for var, _ in terms
+                     if id(var) not in seen and not seen.add(id(var))]
+        key = tuple(sorted(coefs.items()))
+        family_stats = self.stats["rows"].setdefault(family, {"rows": 0, "nonzeros": 0,
+                                                              "duplicates": 0, "dominated": 0})
+        row = self.rows.get(key)
+        if row is not None:
+            if row.lb() == lb and row.ub() == ub:
+                family_stats["duplicates"] += 1
+                self.stats["duplicates"] += 1
             else:
-                solver.Add(x[(staff["id"], "PH", day["dayOfWeek"])] == 0)
+                family_stats["dominated"] += 1
+                self.stats["dominated"] += 1
+                row.SetBounds(max(row.lb(), lb), min(row.ub(), ub))
+            return row
 
-    #Achive 0.5 working days per week for staff who needs it (hard)
-    for staff in staffs:
-         if staff["desiredHalfDayShift"]:
-              solver.Add(solver.Sum(x[(staff["id"],"M3",k)] for k in days_list) == 1)
-                        
-    #Undesired 0.5 working days per week for staffs who do NOT need it (hard)
-    for staff in staffs:
-         if not staff["desiredHalfDayShift"]:
-            solver.Add(solver.Sum(x[(staff["id"],"M3",k)] for k in days_list) == 0)
-
-    #Calculate actual working hours for each staff (axiliary)
-    for i in staffs_list:
-        solver.Add(actual_WH[i] == solver.Sum(x[(i,shift["id"],k)]*shift["duration"] 
-                                    for shift in shifts 
-                                    for k in days_list))
-
-
-    #Each staff must work exactly 44 hours per week (hard) => keep
-    for i in staffs_list:
-         solver.Add(actual_WH[i]== 44)
-
-#     #Each staff must work exactly 44 hours per week (hard) => relaxed version
-#     code_1 = "Add_hours"
-#     s[code_1] = {}
-
-#     code_2 = "Minus_hours"
-#     s[code_2] = {} 
-  
-#     for i in staffs_list:
-#          v_add = solver.IntVar(0.0, solver.infinity(), f'{code_1}')
-#          s[code_1][f'staff_{i}'] = v_add
-
-#          v_minus = solver.IntVar(0.0, solver.infinity(), f'{code_2}')
-#          s[code_2][f'staff_{i}'] = v_minus
-
-#          solver.Add(actual_WH[i] + v_add - v_minus == 44)
-#          slack.append(v_add)
-#          slack.append(v_minus)
-
-    #Undesire afternoon shift after shift DO (soft)
-    code = "DO-AM_shifts"
-    s[code] = {}
-
-    for i in staffs_list:
-         for k in days_list:
-              if k != week_last_idx:
-                v = solver.IntVar(0, solver.infinity(), f'{code}')
-                s[code][(f'staff_{i}',f'day_{k}')] = v
-                solver.Add(x[(i,"DO",k)] 
-                           + solver.Sum(x[(i,shift["id"],k+1)] 
-                                        for shift in shifts if shift["shiftType"] == "afternoon")
-                            <= 1 + v)
-                slack.append(v)
-    
-    #Undesire afternoon shift after shift PH (soft)    
-    code = "PH-AM_shifts"
-    s[code] = {}
-
-    for i in staffs_list:
-         for k in days_list:
-              if k != week_last_idx:
-                v = solver.IntVar(0, solver.infinity(), f'{code}')
-                s[code][(f'staff_{i}',f'day_{k}')] = v
-                for shift in shifts:
-                    if shift["shiftType"] == "afternoon":
-                            solver.Add(x[(i,"PH",k)] + solver.Sum(x[(i,shift["id"],k+1)]
-                                                         for shift in shifts if shift["shiftType"] == "afternoon") 
-                                                         <= 1 + v)
-                slack.append(v)
+        row = self.solver.Constraint(lb, ub)
+        for var, coef in terms:
+            row.SetCoefficient(var, coef)
+        self.rows[key] = row
+        family_stats["rows"] += 1
+        family_stats["nonzeros"] += len(key)
+        return row
+
+    def set_week(self, days, mode="hard", boundary=None):
+        #Re-parameterise the compiled model for the given horizon.
+        #boundary is the committed x_val before the horizon ((staff, shift, day id) keys),
+        #only its last two days are read.
+        if mode not in SOLVE_MODES:
+            raise ValueError(f'Unknown solve mode: {mode}')
+        if horizon_layout(days) != self.layout:
+            raise ValueError("Horizon layout does not match the compiled model")
+        infinity = self.solver.infinity()
+        staffs_list = self.index["staffs_list"]
+
+        for setter, args in reversed(self.overrides):
+            setter(*args)
+        self.overrides = []
+
+        #Assign PH shift to staff who needs it (hard)
+        for i in staffs_list:
+            for p, day in enumerate(days):
+                ph = 1 if i in self.index["off_on_ph"] and day["isHoliday"] else 0
+                self.x[self.x_index(i, "PH", p)].SetBounds(ph, ph)
+
+        #Coverage right-hand sides
+        for p, day in enumerate(days):
+            self.cov_rows["morning"][p].SetBounds(day["morningShiftCov"], day["morningShiftCov"])
+            self.cov_rows["afternoon"][p].SetBounds(day["afternoonShiftCov"], day["afternoonShiftCov"])
+
+        #Boundary rows: afternoon(first day) <= 1 - DO/PH(day before), 3AM windows
+        #reaching back into the committed roster
+        boundary = boundary or {}
+        prev_1 = days[0]["id"] - 1
+        prev_2 = days[0]["id"] - 2
+        afternoon_ids = self.index["shift_type"].get("afternoon", [])
+        for i in staffs_list:
+            pm_1 = sum(round(boundary.get((i, j, prev_1), 0)) for j in afternoon_ids)
+            pm_2 = sum(round(boundary.get((i, j, prev_2), 0)) for j in afternoon_ids)
+            self.boundary_rows["DO"][i].SetBounds(-infinity, 1 - round(boundary.get((i, "DO", prev_1), 0)))
+            self.boundary_rows["PH"][i].SetBounds(-infinity, 1 - round(boundary.get((i, "PH", prev_1), 0)))
+            self.boundary_rows["3AM_prev"][i].SetBounds(-infinity, 2 - pm_1 - pm_2)
+            if i in self.boundary_rows["3AM_first"]:
+                self.boundary_rows["3AM_first"][i].SetBounds(-infinity, 2 - pm_1)
+
+        #A committed roster before the horizon tells staff of a class apart
+        self.symmetric = bool(self.symmetry_rows) and not any(val > 0.5 for val in boundary.values())
+        for row in self.symmetry_rows:
+            row.SetBounds(0 if self.symmetric else -infinity, infinity)
+
+        #Hard model fixes relaxable slack to zero, elastic model puts it in a penalty tier
+        objective = self.solver.Objective()
+        weight = HARD_PENALTY if mode == "elastic" else 1
+        for code in RELAXABLE_CODES:
+            for v in self.s[code].values():
+                v.SetBounds(0, 0 if mode == "hard" else infinity)
+                objective.SetCoefficient(v, weight)
+
+        self.days = days
+        self.pos_of_id = {day["id"]: p for p, day in enumerate(days)}
+        self.mode = mode
+
+    def set_repair(self, fixed=None, hours=None, keep=None):
+        #Repair solve on top of set_week: fixed x values ((staff, shift, day id) keys),
+        #weekly hours targets ((staff, week offset) keys) and objective rewards for
+        #assignments worth keeping ((staff, shift, day id) keys)
+        objective = self.solver.Objective()
+        if self.symmetric and (fixed or hours or keep):
+            for row in self.symmetry_rows:
+                self.overrides.append((row.SetBounds, (row.lb(), row.ub())))
+                row.SetBounds(-self.solver.infinity(), self.solver.infinity())
+            self.symmetric = False
+        for (i, j, d), val in (fixed or {}).items():
+            var = self.x[self.x_index(i, j, self.pos_of_id[d])]
+            self.overrides.append((var.SetBounds, (var.lb(), var.ub())))
+            var.SetBounds(val, val)
+        for key, target in (hours or {}).items():
+            row = self.hours_rows[key]
+            self.overrides.append((row.SetBounds, (row.lb(), row.ub())))
+            row.SetBounds(target, target)
+        for (i, j, d), weight in (keep or {}).items():
+            var = self.x[self.x_index(i, j, self.pos_of_id[d])]
+            self.overrides.append((objective.SetCoefficient, (var, objective.GetCoefficient(var))))
+            objective.SetCoefficient(var, -weight)
+
+    def set_hint(self, hint, check=True):
+        #Pass a previous x_val ((staff, shift, day id) keys) as starting solution, use
+        #shift_roster to move another horizon's roster onto these days.
+        #Working hours are derived so the hint is complete for every row without slack.
+        hint = hint or {}
+        if self.symmetric:
+            hint = self.order_hint(hint)
+        #Every shift of a hinted (staff, day) cell is hinted, missing keys are 0
+        values = np.zeros(self.x_shape)
+        covered = np.zeros((self.x_shape[0], self.x_shape[2]), dtype=bool)
+        for (i, j, d), val in hint.items():
+            p = self.pos_of_id.get(d)
+            n = self.staff_pos.get(i)
+            k = self.shift_pos.get(j)
+            if p is not None and n is not None and k is not None:
+                values[n, k, p] = round(val)
+                covered[n, p] = True
+        hint_idx = np.flatnonzero(np.broadcast_to(covered[:, None, :], self.x_shape))
+        hint_vars = [self.x[idx] for idx in hint_idx]
+        hint_vals = values.ravel()[hint_idx].tolist()
+        if hint_vars:
+            durations = np.array([self.index["duration"][j] for j in self.index["shifts_list"]])
+            hours = np.einsum("nkp,k->np", values, durations)
+            for (i, w), var in self.actual_WH.items():
+                hint_vars.append(var)
+                hint_vals.append(float(hours[self.staff_pos[i], self.weeks[w]].sum()))
+        self.solver.SetHint(hint_vars, hint_vals)
 
-    #Undesire 3 consecutive afternoon shifts (soft)
-    code = "3AM_shifts"
-    s[code] = {}
-    
-    for i in staffs_list:
-         for k in days_list:
-              if k not in [week_start_idx, week_last_idx]:
-                   v = solver.IntVar(0, solver.infinity(), f'{code}')
-                   s[code][(f'staff_{i}',f'day_{k}')] = v
-
-                   day_0 =  solver.Sum(x[(i,shift["id"],k-1)] 
-                                for shift in shifts if shift["shiftType"] == "afternoon")   
-
-                   day_1 =  solver.Sum(x[(i,shift["id"],k)] 
-                                for shift in shifts if shift["shiftType"] == "afternoon")
-
-                   day_2 = solver.Sum(x[(i,shift["id"],k+1)] 
-                                for shift in shifts if shift["shiftType"] == "afternoon")   
-
-                   solver.Add(day_0 + day_1 + day_2 <= 2 + v)
-                   slack.append(v)
-    
-    #Morning shift coverage requirement (hard) => relaxed
-    code_1 = "+AM_General_Cov"
-    s[code_1] = {}
-
-    code_2 = "-AM_General_Cov"
-    s[code_2] = {}
-
-    for day in days:
-         v_add = solver.IntVar(0.0, solver.infinity(), f'{code_1}')
-         s[code_1][f'day_{day["id"]}'] = v_add
-         v_minus = solver.IntVar(0.0, solver.infinity(), f'{code_2}')
-         s[code_2][f'day_{day["id"]}'] = v_minus
-
-         solver.Add(solver.Sum(x[(i,shift["id"],day["dayOfWeek"])] 
-                        for i in staffs_list for shift in shifts if shift["shiftType"] == "morning")
-                    == day["morningShiftCov"] 
-                         + v_add
-                         - v_minus)     
-         slack.append(v_add)
-         slack.append(v_minus)
-
-         
-    #Afternoon shift coverage requirement(hard)
-    code_1 = "+PM_General_Cov"
-    s[code_1] = {}
-    code_2 = "-PM_General_Cov"
-    s[code_2] = {}
-    for day in days:
-         v_add = solver.IntVar(0.0, solver.infinity(), f'{"+PM_General_Cov"}')
-         s[code_1][f'day_{day["id"]}'] = v_add
-         v_minus = solver.IntVar(0.0, solver.infinity(), f'{"-PM_General_Cov"}')
-         s[code_2][f'day_{day["id"]}'] = v_minus
-         
-         solver.Add(solver.Sum(x[(i,shift["id"],day["dayOfWeek"])] 
-                        for i in staffs_list for shift in shifts if shift["shiftType"] == "afternoon")
-                    == day["afternoonShiftCov"] 
-                         + v_add
-                         - v_minus)  
-         slack.append(v_add)
-         slack.append(v_minus)
-
-    #Morning Agency coverage requirement (soft)    
-    code = "Morning_Agency_Cov"
-    s[code] = {}
-    for k in days_list:
-        for a in agency_list:
-             v = solver.IntVar(0, solver.infinity(), f'{code}')
-             s[code][(f'day_{k}',a)] = v
-             solver.Add(solver.Sum(x[(staff["id"],shift["id"],k)]
-                            for staff in staffs if staff["agency"] == a
-                            for shift in shifts if shift["shiftType"] == "morning")
-                              >= 1 - v)
-             slack.append(v)
-                        
-
-    #Afternoon Agency coverage requirement (hard) => relaxed
-    code = "Afternoon_Agency_Cov"
-    s[code] = {}
-    for k in days_list:
-        for a in agency_list:
-             v = solver.IntVar(0, solver.infinity(), f'{code}')
-             s[code][(f'day_{k}',a)] = v
-             solver.Add(solver.Sum(x[(staff["id"],shift["id"],k)]
-                            for staff in staffs if staff["agency"] == a
-                            for shift in shifts if shift["shiftType"] == "afternoon")
-                              >= 1 - v)
-             slack.append(v)
-    
-    #Define objective function
-    solver.Minimize(solver.Sum(slack))
-
-    status = solver.Solve()
-    if status == pywraplp.Solver.OPTIMAL:
-        print("Find optimal solution!")
-        print(f'Objective value = {solver.Objective().Value()}')
-        x_val = {
-               key: var.solution_value()
-               for key, var in x.items()
-               }
+        info = {"hint_vars": len(hint_vars)}
+        if hint_vars and check:
+            info["hint_feasible"] = self.check_hint(hint_vars, hint_vals)
+        return info
+
+    def order_hint(self, hint):
+        #Hint with the rosters of each class handed out in the order the symmetry rows
+        #require, the hinted roster itself is unchanged up to relabelling staff
+        first_week = self.weeks[min(self.weeks)]
+        first_ids = [self.days[p]["id"] for p in first_week]
+        do_day = {}
+        for (i, j, d), val in hint.items():
+            if val > 0.5 and j == "DO" and d in first_ids:
+                do_day[i] = first_ids.index(d)
+        relabel = {}
+        for members in staff_classes(self.staffs).values():
+            ranked = sorted(members, key=lambda i: do_day.get(i, 0), reverse=True)
+            relabel.update(zip(ranked, members))
+        return {(relabel.get(i, i), j, d): val for (i, j, d), val in hint.items()}
+
+    def check_hint(self, hint_vars, hint_vals):
+        #A hint is usable as incumbent when the hinted values respect their bounds and
+        #every row can still be met by the unhinted (slack) variables within their bounds
+        proto = linear_solver_pb2.MPModelProto()
+        self.solver.ExportModelToProto(proto)
+        values = {var.index(): val for var, val in zip(hint_vars, hint_vals)}
+        bounds = [(v.lower_bound, v.upper_bound) for v in proto.variable]
+        for idx, val in values.items():
+            if not bounds[idx][0] <= val <= bounds[idx][1]:
+                return False
+        for ct in proto.constraint:
+            low = high = 0.0
+            for idx, coef in zip(ct.var_index, ct.coefficient):
+                if idx in values:
+                    low += coef * values[idx]
+                    high += coef * values[idx]
+                else:
+                    lb, ub = bounds[idx]
+                    low += min(coef * lb, coef * ub)
+                    high += max(coef * lb, coef * ub)
+            if high < ct.lower_bound - 1e-6 or low > ct.upper_bound + 1e-6:
+                return False
+        return True
+
+    def solve(self, days, mode="hard", hint=None, time_limit=None, gap=None, boundary=None,
+              repair=None, check_hint=True):
+        #time_limit in seconds and relative gap tolerance, None for no limit.
+        #The best incumbent is kept when the solve stops at the limit (FEASIBLE).
+        #repair holds the set_repair arguments of a repair solve.
+        #check_hint=False skips the hint feasibility check (a model export per solve).
+        start = time.perf_counter()
+        if hint and self.backend == "SCIP":
+            if self.hinted_solves >= SCIP_HINT_LIMIT:
+                self.reload()
+            self.hinted_solves += 1
+        solver = self.solver
+        self.set_week(days, mode, boundary)
+        if repair:
+            self.set_repair(**repair)
+        #Always reset the hint and the time limit, the compiled model keeps them between solves
+        info = self.set_hint(hint, check_hint)
+        params = solve_params(solver, time_limit, gap, mode)
+        info["mode"] = mode
+        info["backend"] = self.backend
+        #Build time is only paid by the first solve on a compiled model
+        info["model_reused"] = self.solve_count > 0
+        info["model_from_disk"] = self.from_disk
+        info["build_time"] = 0.0 if self.solve_count else self.build_time
+        info["setup_time"] = time.perf_counter() - start
+        self.solve_count += 1
+
+        start = time.perf_counter()
+        solver_start = solver.wall_time()
+        status = solver.Solve(params)
+        info["solve_time"] = time.perf_counter() - start
+        info.update(solver_telemetry(solver, status,
+                                     sum(r["nonzeros"] for r in self.stats["rows"].values())))
+        #wall_time() counts from the creation of the solver
+        info["solver_wall_time"] = (solver.wall_time() - solver_start) / 1000
+
+        if status == pywraplp.Solver.OPTIMAL:
+            print("Find optimal solution!")
+            print(f'Objective value = {solver.Objective().Value()}')
+
+        elif status == pywraplp.Solver.FEASIBLE:
+            print(f'Find feasible solution, gap = {info["gap"]:.2%}')
+            print(f'Objective value = {solver.Objective().Value()}')
+
+        elif status == pywraplp.Solver.INFEASIBLE:
+            print('Infeasible solution!')
+            return SolveResult(None, None, info)
+
+        else:
+            print("Solver can not find any solution!")
+            return SolveResult(None, None, info)
+
+        start = time.perf_counter()
+        x_val, slack_val = self.extract()
+        info["extract_time"] = time.perf_counter() - start
+        return SolveResult(x_val, slack_val, info)
+
+    def day_id(self, p):
+        #Position -1 is the day before the horizon
+        return self.days[p]["id"] if p >= 0 else self.days[0]["id"] + p
+
+    def solution_values(self):
+        #Values of all variables of the last solve as one array, by solver index
+        response = linear_solver_pb2.MPSolutionResponse()
+        self.solver.FillSolutionResponseProto(response)
+        return np.array(response.variable_value)
+
+    def x_array(self, values=None):
+        #Shift variables as a staff x shift x horizon position array
+        if values is None:
+            values = self.solution_values()
+        return values[:len(self.x)].reshape(self.x_shape)
+
+    def extract(self, positions=None):
+        #Solution keyed by (staff, shift, day id), slacks labelled with day ids.
+        #Only assigned shifts and violated slacks are listed, missing keys are 0.
+        #positions restricts the result to some days of the horizon (rolling commits).
+        #A cross-day slack belongs to the last day it covers, as the validator counts it,
+        #so a pair or triple reaching past the positions is left to the solve that commits
+        #that day (through its boundary rows).
+        values = self.solution_values()
+        assigned = self.x_array(values) > 0.5
+        if positions is not None:
+            assigned[:, :, [p for p in range(self.x_shape[2]) if p not in positions]] = False
+        staffs_list = self.index["staffs_list"]
+        shifts_list = self.index["shifts_list"]
+        x_val = {(staffs_list[n], shifts_list[k], self.days[p]["id"]): 1.0
+                 for n, k, p in zip(*np.nonzero(assigned))}
         slack_val = {}
 
-        for code in s:
-             slack_val[code] = {}
-             for key, var in s[code].items():
-                  slack_val[code][key] = {
-                       "value": var.solution_value(),
-                       "name": var.name()
+        for code, (keys, indices) in self.slack_keys.items():
+            if code in RELAXABLE_CODES and self.mode == "hard":
+                continue
+            slack_val[code] = {}
+            #Continuous slacks can carry solver noise, every slack is integral by model
+            slack = np.rint(values[indices])
+            for n in np.flatnonzero(slack > 0):
+                key = keys[n]
+                if isinstance(key, int):
+                    p = key
+                    label = f'day_{self.day_id(p)}'
+                elif code in ("Morning_Agency_Cov", "Afternoon_Agency_Cov"):
+                    p, a = key
+                    label = (f'day_{self.day_id(p)}', a)
+                else:
+                    i, p = key
+                    label = (f'staff_{i}', f'day_{self.day_id(p)}')
+                if positions is not None and (p + 1 if code in CROSS_DAY_CODES else p) not in positions:
+                    continue
+                slack_val[code][label] = {
+                     "value": float(slack[n]),
+                     "name": code
                     }
         return x_val, slack_val
 
-    elif status == pywraplp.Solver.INFEASIBLE:
-        print('Infeasible solution!')
-        return None, None
-        
+
+def format_model_stats(stats):
+    #Model inspection report: variables and rows per family, collapsed rows
+    lines = [f'{"family":<22} {"vars":>7} {"rows":>7} {"nonzeros":>9} {"dup":>5} {"dom":>5}']
+    families = list(stats["variables"]) + [f for f in stats["rows"] if f not in stats["variables"]]
+    for family in families:
+        row_stats = stats["rows"].get(family, {})
+        lines.append(f'{family:<22} {stats["variables"].get(family, 0):>7} '
+                     f'{row_stats.get("rows", 0):>7} {row_stats.get("nonzeros", 0):>9} '
+                     f'{row_stats.get("duplicates", 0):>5} {row_stats.get("dominated", 0):>5}')
+    lines.append(f'{"total":<22} {sum(stats["variables"].values()):>7} '
+                 f'{sum(r["rows"] for r in stats["rows"].values()):>7} '
+                 f'{sum(r["nonzeros"] for r in stats["rows"].values()):>9} '
+                 f'{stats["duplicates"]:>5} {stats["dominated"]:>5}')
+    return "\n".join(lines)
+
+
+def get_model(scheduling_data, days, backend="SCIP", symmetry=False, names=True):
+    #Reuse a compiled model when staffs, shifts, horizon layout, backend,
+    #symmetry breaking and variable naming are unchanged
+    layout = horizon_layout(days)
+    key = (json.dumps(scheduling_data["staffs"], sort_keys=True),
+           json.dumps(scheduling_data["shifts"], sort_keys=True),
+           layout, backend, symmetry, names)
+    model = _model_cache.get(key)
+    if model is None:
+        model = RosterModel(scheduling_data["staffs"], scheduling_data["shifts"], layout, backend,
+                            symmetry=symmetry, names=names)
+        _model_cache[key] = model
+        if len(_model_cache) > MODEL_CACHE_SIZE:
+            _model_cache.popitem(last=False)
     else:
-         print("Solver can not find any optimal solution!")
-         return None, None
\ No newline at end of file
+        _model_cache.move_to_end(key)
+    return model
+
+
+def week_days(scheduling_data, current_week):
+    return [day for day in scheduling_data["periods"]
+                 if day["week"] == current_week]
+
+
+def horizon_days(scheduling_data, weeks):
+    weeks = set(weeks)
+    return [day for day in scheduling_data["periods"]
+                 if day["week"] in weeks]
+
+
+def shift_roster(x_val, offset):
+    #Move a roster by offset days, e.g. last week's roster onto this week with offset 7
+    return {(i, j, d + offset): val for (i, j, d), val in x_val.items()}
+
+
+def shift_label(label, offset):
+    #Slack label with its day ids moved by offset days
+    if isinstance(label, tuple):
+        return tuple(shift_label(part, offset) for part in label)
+    if label.startswith("day_"):
+        return f'day_{int(label[4:]) + offset}'
+    return label
+
+
+def week_fingerprint(scheduling_data, current_week, *settings):
+    #Everything a weekly solve depends on: the week's periods rows without their
+    #dates and ids, staffs, shifts and the solve settings
+    days = [{k: v for k, v in day.items() if k not in ("date", "id", "week")}
+            for day in week_days(scheduling_data, current_week)]
+    return cache_key(days, scheduling_data["staffs"], scheduling_data["shifts"], *settings)
+
+
+def reuse_week(scheduling_data, result, source_week, source_day, current_week):
+    #Result of an identical week moved onto current_week. source_day is the first day id
+    #of the week the result was solved for, the offset never looks the source week up in
+    #scheduling_data.
+    offset = week_days(scheduling_data, current_week)[0]["id"] - source_day
+    info = dict(result.info, memo_of=source_week, build_time=0.0, solve_time=0.0)
+    if result[0] is None:
+        return SolveResult(None, None, info)
+    slack_val = {code: {shift_label(label, offset): dict(value) for label, value in values.items()}
+                 for code, values in result[1].items()}
+    return SolveResult(shift_roster(result[0], offset), slack_val, info)
+
+
+def solve_horizon(scheduling_data, weeks, mode="elastic", model=None, hint=None, backend="SCIP",
+                  time_limit=None, gap=None, boundary=None, symmetry=False):
+    days = horizon_days(scheduling_data, weeks)
+    if model is None:
+        model = get_model(scheduling_data, days, backend, symmetry)
+    result = model.solve(days, mode=mode, hint=hint, time_limit=time_limit, gap=gap, boundary=boundary)
+    if mode == "elastic" and result[0] is not None:
+        if hard_slack_used(result[1]):
+            print("Hard-tier slack used, horizon is infeasible as a hard model")
+        else:
+            print("No hard-tier slack used")
+    return result
+
+
+def hard_solve(scheduling_data, current_week, model=None, hint=None, backend="SCIP",
+               time_limit=None, gap=None, boundary=None):
+    return solve_horizon(scheduling_data, [current_week], "hard", model, hint, backend,
+                         time_limit, gap, boundary)
+
+
+def relaxed_solve(scheduling_data, current_week, model=None, hint=None, backend="SCIP",
+                  time_limit=None, gap=None, boundary=None):
+    return solve_horizon(scheduling_data, [current_week], "relaxed", model, hint, backend,
+                         time_limit, gap, boundary)
+
+
+def elastic_solve(scheduling_data, current_week, model=None, hint=None, backend="SCIP",
+                  time_limit=None, gap=None, boundary=None):
+    #Single solve covering both the feasible and the infeasible week:
+    #relaxable hard rows keep their slack but at HARD_PENALTY per unit
+    return solve_horizon(scheduling_data, [current_week], "elastic", model, hint, backend,
+                         time_limit, gap, boundary)
+
+
+def hard_slack_used(slack_val):
+    return any(info["value"] > 0
+               for code in RELAXABLE_CODES
+               for info in slack_val.get(code, {}).values())
+
+
+def solve_week(scheduling_data, current_week, elastic=True, hint=None, backend="SCIP",
+               time_limit=None, gap=None, boundary=None, engine="mip", memo=None, symmetry=False,
+               screen=True):
+    #Elastic single solve by default, otherwise hard model first and relaxed
+    #model when the week is infeasible.
+    #engine "pattern" solves the week with the pattern-based model instead, "lns"
+    #improves a first roster by large neighbourhood search within time_limit, "greedy"
+    #only builds the heuristic roster.
+    #memo is the week memo of one run, {fingerprint: (week, first day id, result)}: a week
+    #with the same inputs as one solved before in the run reuses its roster. None solves
+    #every week. It must not outlive the run, the fingerprint leaves out ids and dates.
+    #symmetry breaks the symmetry of interchangeable staff in the mip model, the
+    #pattern engine aggregates them into class counts instead.
+    #screen checks the week before the hard solve and goes straight to the relaxed
+    #model when the hard one is proven infeasible.
+    #time_limit is the budget of the whole call: screening counts against it and the hard
+    #attempt leaves the relaxed fallback at least 1 - HARD_SHARE of it.
+    #Top-level so it can be sent to a worker process.
+    print("---------Start solving for ", f'week {current_week}---------')
+    key = None
+    if memo is not None and boundary is None:
+        key = week_fingerprint(scheduling_data, current_week, elastic, backend, time_limit, gap, engine,
+                               symmetry)
+        if key in memo:
+            source_week, source_day, result = memo[key]
+            print(f'Same inputs as week {source_week}, reusing its roster')
+            return reuse_week(scheduling_data, result, source_week, source_day, current_week)
+    start = time.perf_counter()
+    def remaining(share=1):
+        if time_limit is None:
+            return None
+        return max((time_limit - (time.perf_counter() - start)) * share, MIN_SOLVE_TIME)
+    if engine == "pattern":
+        #pattern_model builds on this module, import it on use only
+        from pattern_model import pattern_solve
+        solve = lambda mode, limit: pattern_solve(scheduling_data, current_week, mode, backend,
+                                                  limit, gap, boundary)
+    elif engine == "lns":
+        from lns import lns_solve
+        solve = lambda mode, limit: lns_solve(scheduling_data, [current_week], mode, backend,
+                                              limit, boundary)
+    elif engine == "greedy":
+        from heuristic import greedy_solve
+        solve = lambda mode, limit: greedy_solve(scheduling_data, current_week, mode, boundary)
+    elif engine == "mip":
+        solve = lambda mode, limit: solve_horizon(scheduling_data, [current_week], mode, None, hint,
+                                                  backend, limit, gap, boundary, symmetry)
+    else:
+        raise ValueError(f'Unknown engine: {engine}')
+    if elastic:
+        result = solve("elastic", remaining())
+    else:
+        screening = None
+        if screen:
+            from screening import screen_week, format_screening
+            #The LP probe needs the compiled mip model, other engines get the closed-form checks
+            screening = screen_week(scheduling_data, current_week, backend, boundary, engine == "mip", symmetry)
+            print(format_screening(screening))
+        if screening and screening["infeasible"]:
+            print("Switch to relaxed model...")
+            result = solve("relaxed", remaining())
+            result.info["screening"] = screening
+        else:
+            result = solve("hard", remaining(HARD_SHARE))
+            if result[0] == None:
+                print("Switch to relaxed model...")
+                hard_info = result.info
+                result = solve("relaxed", remaining())
+                result.info["hard_attempt"] = hard_info
+            if screening:
+                result.info["screening"] = screening
+    if hint and engine == "mip":
+        print(f'Hint feasible: {result.info.get("hint_feasible")}, '
+              f'solve time {result.info["solve_time"]:.3f}s')
+    if key is not None:
+        memo[key] = (current_week, week_days(scheduling_data, current_week)[0]["id"], result)
+    return result
+
+
+def rolling_solve(scheduling_data, weeks, window=2, commit=1, elastic=True, warm_start=False,
+                  backend="SCIP", time_limit=None, gap=None, symmetry=False):
+    #Solve an overlapping window of weeks, keep the first commit weeks and carry
+    #their roster forward as boundary state of the next window.
+    #Returns one SolveResult per week, in week order.
+    return list(rolling_weeks(scheduling_data, weeks, window, commit, elastic, warm_start, backend,
+                              time_limit, gap, symmetry))
+
+
+def rolling_weeks(scheduling_data, weeks, window=2, commit=1, elastic=True, warm_start=False,
+                  backend="SCIP", time_limit=None, gap=None, symmetry=False):
+    #rolling_solve yielding the committed weeks of each window as soon as it is solved
+    if not 1 <= commit <= window:
+        raise ValueError("commit must be between 1 and window")
+    mode = "elastic" if elastic else "relaxed"
+    boundary = None
+    hint = None
+    start = 0
+    while start < len(weeks):
+        window_weeks = weeks[start:start + window]
+        commit_weeks = window_weeks[:commit]
+        print("---------Start solving for ", f'weeks {window_weeks}, committing {commit_weeks}---------')
+        days = horizon_days(scheduling_data, window_weeks)
+        model = get_model(scheduling_data, days, backend, symmetry)
+        result = solve_horizon(scheduling_data, window_weeks, mode, model, hint, backend,
+                               time_limit, gap, boundary)
+
+        for current_week in commit_weeks:
+            if result[0] is None:
+                committed = SolveResult(None, None, dict(result.info))
+            else:
+                #Cross-day slacks go to the week of their last day: the boundary rows before
+                #the window to its first committed week, pairs reaching the next window's
+                #first day to that window
+                week_pos = {p for p, day in enumerate(days) if day["week"] == current_week}
+                x_val, slack_val = model.extract(week_pos)
+                committed = SolveResult(x_val, slack_val, dict(result.info, window=window_weeks))
+            yield committed
+
+        boundary = committed[0]
+        #Overlapping days keep their day ids, the previous window is a hint as is
+        if warm_start and result[0] is not None:
+            hint = result[0]
+        start += commit
@@ -0,0 +1,95 @@
+import csv
+import importlib.util
+import os
+import numpy as np
+
+#Tabular export of the solved roster straight from the solver results: the
+#staff x day pivot dump_results_xlsx.py builds from scheduling_result.json and a
+#violations table. Weeks are collected into one staff x day array of shift ids
+#as they are solved and written once at the end: Excel through a write-only
+#(streaming) workbook, CSV, or Parquet (needs pyarrow).
+#dump_results_xlsx.py remains the way to refresh the formatted Solution.xlsx.
+
+TABLE_FORMATS = ["xlsx", "csv", "parquet"]
+
+VIOLATION_COLUMNS = ["week", "family", "key", "slack"]
+
+
+class TableExporter:
+
+    def __init__(self, scheduling_data, result_dir="result/Q1", formats=("xlsx",)):
+        for table_format in formats:
+            if table_format not in TABLE_FORMATS:
+                raise ValueError(f'Unknown table format: {table_format}')
+        self.formats = list(formats)
+        #Checked before any week is solved rather than when writing
+        if "parquet" in self.formats and not any(importlib.util.find_spec(engine)
+                                                 for engine in ("pyarrow", "fastparquet")):
+            raise RuntimeError("Parquet export needs pyarrow or fastparquet, install one or choose xlsx/csv")
+        self.result_dir = result_dir
+        self.staffs_list = [staff["id"] for staff in scheduling_data["staffs"]]
+        self.staff_row = {i: n for n, i in enumerate(self.staffs_list)}
+        periods = sorted(scheduling_data["periods"], key=lambda day: day["id"])
+        self.dates = [day["date"] for day in periods]
+        self.day_col = {day["id"]: p for p, day in enumerate(periods)}
+        #Shift id per staff and day, None where no week was solved
+        self.roster = np.full((len(self.staffs_list), len(periods)), None, dtype=object)
+        self.violations = []
+
+    def add_week(self, current_week, x_val, slack_val):
+        for (i, j, d), val in x_val.items():
+            if val > 0.5 and d in self.day_col:
+                self.roster[self.staff_row[i], self.day_col[d]] = j
+        for code, cells in slack_val.items():
+            for key, info in cells.items():
+                if info["value"] > 0:
+                    self.violations.append([current_week, code, str(key), info["value"]])
+
+    def columns(self):
+        #Solved days only, like the pivot of the solved cells
+        return np.flatnonzero((self.roster != None).any(axis=0)).tolist()
+
+    def pivot_rows(self):
+        columns = self.columns()
+        yield ["staff"] + [self.dates[p] for p in columns]
+        for n, i in enumerate(self.staffs_list):
+            yield [i] + [self.roster[n, p] for p in columns]
+
+    def write(self):
+        #Paths written per format
+        os.makedirs(self.result_dir, exist_ok=True)
+        written = []
+        for table_format in self.formats:
+            written += getattr(self, f'write_{table_format}')()
+        return written
+
+    def write_xlsx(self):
+        #openpyxl is imported on use, only the xlsx format needs it
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Raw_results")
+        for row in self.pivot_rows():
+            sheet.append(row)
+        sheet = workbook.create_sheet("Violations")
+        sheet.append(VIOLATION_COLUMNS)
+        for row in self.violations:
+            sheet.append(row)
+        path = os.path.join(self.result_dir, "roster.xlsx")
+        workbook.save(path)
+        return [path]
+
+    def write_csv(self):
+        paths = [os.path.join(self.result_dir, "roster.csv"), os.path.join(self.result_dir, "violations.csv")]
+        for path, rows in zip(paths, [self.pivot_rows(), [VIOLATION_COLUMNS] + self.violations]):
+            with open(path, "w", newline="") as f:
+                csv.writer(f).writerows(rows)
+        return paths
+
+    def write_parquet(self):
+        import pandas as pd
+        rows = self.pivot_rows()
+        header = next(rows)
+        paths = [os.path.join(self.result_dir, "roster.parquet"), os.path.join(self.result_dir, "violations.parquet")]
+        pd.DataFrame(list(rows), columns=header).to_parquet(paths[0], index=False)
+        pd.DataFrame(self.violations, columns=VIOLATION_COLUMNS).to_parquet(paths[1], index=False)
+        return paths
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from instance_loader import load_data
+from solver_core import get_model, horizon_days, rolling_solve, CROSS_DAY_CODES
+from validator import RosterValidator
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scheduling_data.json")
+
+
+def cross_day_cells(slack_val):
+    return {(code, label) for code in CROSS_DAY_CODES
+            for label, info in slack_val.get(code, {}).items() if info["value"] > 0}
+
+
+def validator_cells(scheduling_data, x_val, week):
+    #Cross-day cells of the whole roster the validator puts in week (week of their last day)
+    validator = RosterValidator(scheduling_data, cross_week=True)
+    return {(code, label) for code, w, label, value in validator.cells(x_val)
+            if w == week and code in CROSS_DAY_CODES}
+
+
+def test_extract_leaves_pairs_past_the_positions():
+    #DO on the last day of week 1 and an afternoon on the first day of week 2: the pair
+    #ends in week 2, extracting week 1 alone must not report it
+    scheduling_data = load_data(DATA)
+    days = horizon_days(scheduling_data, [1, 2])
+    model = get_model(scheduling_data, days)
+    result = model.solve(days, "elastic", repair={"fixed": {(1, "DO", 6): 1, (1, "A1", 7): 1}})
+    assert ("staff_1", "day_6") in result[1]["DO-AM_shifts"]
+    x_first, slack_first = model.extract(set(range(7)))
+    x_second, slack_second = model.extract(set(range(7, 14)))
+    assert (1, "A1", 7) not in x_first
+    assert ("staff_1", "day_6") not in slack_first["DO-AM_shifts"]
+    assert ("staff_1", "day_6") in slack_second["DO-AM_shifts"]
+    roster = {**x_first, **x_second}
+    assert cross_day_cells(slack_first) == validator_cells(scheduling_data, roster, 1)
+    assert cross_day_cells(slack_second) == validator_cells(scheduling_data, roster, 2)
+
+
+@pytest.mark.parametrize("window, commit", [(2, 1), (3, 2), (2, 2)])
+def test_rolling_cross_day_slack_matches_validator(window, commit):
+    #Every committed week reports the cross-day cells the validator finds in the
+    #final roster for it, none of a day a later window re-solves
+    scheduling_data = load_data(DATA)
+    weeks = sorted({day["week"] for day in scheduling_data["periods"]})
+    results = rolling_solve(scheduling_data, weeks, window, commit)
+    roster = {}
+    for result in results:
+        roster.update(result[0])
+    for week, result in zip(weeks, results):
+        assert cross_day_cells(result[1]) == validator_cells(scheduling_data, roster, week)
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from instance_loader import load_data
+from solve_service import JobService, job_options, solve_batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_overrunning_job_fails_and_frees_its_worker(tmp_path):
+    #The first job has no time_limit and runs into the service timeout, its process is
+    #replaced and the next job on the same worker still runs
+    scheduling_data = load_data(os.path.join(ROOT, "scheduling_data.json"))
+
+    async def run():
+        async with JobService(1, str(tmp_path), queue_size=0, job_timeout=0.01) as service:
+            stuck, = service.submit_many([(scheduling_data, None, "stuck")])
+            bounded, = service.submit_many([(scheduling_data, {"time_limit": 30}, "bounded")])
+            await service.join()
+            return service.status(stuck["id"]), service.status(bounded["id"])
+
+    stuck, bounded = asyncio.run(run())
+    assert stuck["status"] == "failed"
+    assert stuck["error"].startswith("TimeoutError")
+    assert stuck["run_time"] < 5
+    assert bounded["status"] == "done", bounded["error"]
+
+
+def test_job_options_accept_a_zero_gap():
+    assert job_options({"gap": 0})["gap"] == 0
+    for options in ({"gap": -0.1}, {"time_limit": 0}, {"time_limit": True}, {"gap": "0"}):
+        with pytest.raises(ValueError):
+            job_options(options)
+
+
+def day_rosters(job_dir, day_ids):
+    #Sorted (staff, shift) assignments per day, in the order of day_ids
+    with open(os.path.join(job_dir, "scheduling_result.json")) as f:
+        roster_days = {}
+        for week in json.load(f)["roster_per_day"]:
+            roster_days.update(week)
+    assert sorted(roster_days) == sorted(f'day_{d}' for d in day_ids)
+    return [sorted((cell["staff"], cell["shift"]) for cell in roster_days[f'day_{d}']) for d in day_ids]
+
+
+def test_jobs_sharing_inputs_on_one_worker(tmp_path):
+    #State must not leak between jobs of one pool process: the input, the same input with
+    #day ids moved by 100 and with weeks renumbered from 5 run as consecutive jobs on one
+    #worker, each comes back with the roster of the first job on its own day ids
+    scheduling_data = load_data(os.path.join(ROOT, "scheduling_data.json"))
+    moved = {**scheduling_data, "periods": [dict(day, id=day["id"] + 100) for day in scheduling_data["periods"]]}
+    renumbered = {**scheduling_data, "periods": [dict(day, week=day["week"] + 4)
+                                                 for day in scheduling_data["periods"]]}
+    inputs = [scheduling_data, moved, renumbered]
+    jobs, _ = solve_batch(inputs, workers=1, output_dir=str(tmp_path))
+
+    rosters = []
+    for job, job_data in zip(jobs, inputs):
+        assert job["status"] == "done", job["error"]
+        roster = day_rosters(job["dir"], [day["id"] for day in job_data["periods"]])
+        assert all(roster)
+        rosters.append(roster)
+    assert rosters[1] == rosters[0]
+    assert rosters[2] == rosters[0]
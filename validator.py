@@ -0,0 +1,192 @@
+from solver_core import build_index, RELAXABLE_CODES, WEEKLY_HOURS
+from repair import load_roster
+from instance_loader import load_data
+import argparse
+import json
+import numpy as np
+
+#Independent roster checker. A roster is a staff x day x shift boolean array and
+#every rule of the weekly model is evaluated with array operations, so rosters
+#from outside the solver (edited by hand, built by heuristics) can be scored.
+#Arrays may carry leading batch axes to score many candidates at once.
+
+#Families reported like the model's slacks, in the model's order
+SOFT_CODES = ["DO-AM_shifts", "PH-AM_shifts", "3AM_shifts",
+              "+AM_General_Cov", "-AM_General_Cov", "+PM_General_Cov", "-PM_General_Cov",
+              "Morning_Agency_Cov", "Afternoon_Agency_Cov"]
+
+#Rules the model never violates, checked for external rosters
+HARD_CODES = ["One_Shift_Per_Day", "One_DO_Per_Week", "PH_Shift", "Half_Day_Shift", "44_Hours"]
+
+#Trailing cell axes of every rule: staff/agency and day or week, day only for coverage
+COVERAGE_CODES = ["+AM_General_Cov", "-AM_General_Cov", "+PM_General_Cov", "-PM_General_Cov"]
+
+
+class RosterValidator:
+    #Compiled once per instance and set of weeks.
+    #cross_week also scores DO-AM/PH-AM/3AM across week boundaries; the weekly
+    #pipeline solves weeks without their predecessor, so it is off by default.
+
+    def __init__(self, scheduling_data, weeks=None, cross_week=False):
+        index = build_index(scheduling_data["staffs"], scheduling_data["shifts"])
+        days = sorted((day for day in scheduling_data["periods"]
+                       if weeks is None or day["week"] in weeks), key=lambda day: day["id"])
+        self.index = index
+        self.days = days
+        self.staff_pos = {i: s for s, i in enumerate(index["staffs_list"])}
+        self.shift_pos = {j: k for k, j in enumerate(index["shifts_list"])}
+        self.day_pos = {day["id"]: p for p, day in enumerate(days)}
+        self.shape = (len(self.staff_pos), len(days), len(self.shift_pos))
+
+        #Week of every day, days of a week are consecutive
+        self.weeks = sorted({day["week"] for day in days})
+        week_of = np.array([self.weeks.index(day["week"]) for day in days])
+        self.week_of = week_of
+        self.week_starts = np.flatnonzero(np.r_[True, week_of[1:] != week_of[:-1]])
+
+        shift_types = index["shift_type"]
+        self.duration = np.array([index["duration"][j] for j in index["shifts_list"]])
+        self.morning = np.isin(index["shifts_list"], shift_types.get("morning", []))
+        self.afternoon = np.isin(index["shifts_list"], shift_types.get("afternoon", []))
+        holiday = np.array([day["isHoliday"] for day in days], dtype=bool)
+        off_on_ph = np.isin(index["staffs_list"], list(index["off_on_ph"]))
+        self.ph_required = off_on_ph[:, None] & holiday[None, :]
+        self.half_day = np.isin(index["staffs_list"], list(index["half_day"])).astype(int)
+        self.agency = np.array([np.isin(index["staffs_list"], index["agency"][a])
+                                for a in index["agencies"]], dtype=int)
+        self.morning_cov = np.array([day["morningShiftCov"] for day in days])
+        self.afternoon_cov = np.array([day["afternoonShiftCov"] for day in days])
+
+        #Consecutive day pairs/triples scored by the cross-day rules
+        ids = np.array([day["id"] for day in days])
+        consecutive = ids[1:] == ids[:-1] + 1
+        if cross_week:
+            self.pair_ok = consecutive
+        else:
+            self.pair_ok = consecutive & (week_of[1:] == week_of[:-1])
+        self.triple_ok = self.pair_ok[1:] & self.pair_ok[:-1]
+
+    def to_array(self, x_val):
+        #x_val ((staff, shift, day id) keys) as staff x day x shift booleans
+        roster = np.zeros(self.shape, dtype=bool)
+        for (i, j, d), val in x_val.items():
+            if val > 0.5 and d in self.day_pos:
+                roster[self.staff_pos[i], self.day_pos[d], self.shift_pos[j]] = True
+        return roster
+
+    def evaluate(self, roster):
+        #Violation amount per rule and cell, for rosters of shape (..., staff, day, shift)
+        roster = np.asarray(roster, dtype=np.int32)
+        shift = lambda j: roster[..., self.shift_pos[j]]
+        week_sum = lambda values: np.add.reduceat(values, self.week_starts, axis=-1)
+        am = roster[..., self.morning].sum(axis=-1)
+        pm = roster[..., self.afternoon].sum(axis=-1)
+
+        rules = {}
+        #Cross-day rules, pairs labelled by their first day and triples by their centre
+        rules["DO-AM_shifts"] = np.maximum(shift("DO")[..., :-1] + pm[..., 1:] - 1, 0) * self.pair_ok
+        rules["PH-AM_shifts"] = np.maximum(shift("PH")[..., :-1] + pm[..., 1:] - 1, 0) * self.pair_ok
+        rules["3AM_shifts"] = np.maximum(pm[..., :-2] + pm[..., 1:-1] + pm[..., 2:] - 2, 0) * self.triple_ok
+
+        am_total = am.sum(axis=-2)
+        pm_total = pm.sum(axis=-2)
+        rules["+AM_General_Cov"] = np.maximum(am_total - self.morning_cov, 0)
+        rules["-AM_General_Cov"] = np.maximum(self.morning_cov - am_total, 0)
+        rules["+PM_General_Cov"] = np.maximum(pm_total - self.afternoon_cov, 0)
+        rules["-PM_General_Cov"] = np.maximum(self.afternoon_cov - pm_total, 0)
+        rules["Morning_Agency_Cov"] = np.maximum(1 - np.einsum("as,...sd->...ad", self.agency, am), 0)
+        rules["Afternoon_Agency_Cov"] = np.maximum(1 - np.einsum("as,...sd->...ad", self.agency, pm), 0)
+
+        rules["One_Shift_Per_Day"] = np.abs(roster.sum(axis=-1) - 1)
+        rules["One_DO_Per_Week"] = np.abs(week_sum(shift("DO")) - 1)
+        rules["PH_Shift"] = np.abs(shift("PH") - self.ph_required)
+        rules["Half_Day_Shift"] = np.abs(week_sum(shift("M3")) - self.half_day[:, None])
+        rules["44_Hours"] = np.abs(week_sum(roster @ self.duration) - WEEKLY_HOURS)
+        return rules
+
+    def score(self, roster):
+        #Total violation per rule, one value per roster of the batch
+        return {code: values.sum(axis=-1 if code in COVERAGE_CODES else (-2, -1))
+                for code, values in self.evaluate(roster).items()}
+
+    def cells(self, x_val):
+        #(code, week, label, value) of every violated cell of one roster, labels and
+        #order as in the model's slacks. Cross-day cells belong to the week of their last day.
+        rules = self.evaluate(self.to_array(x_val))
+        staff = lambda s: f'staff_{self.index["staffs_list"][s]}'
+        day = lambda p: f'day_{self.days[p]["id"]}'
+        week_of = self.week_of
+        pair = lambda s, p: (week_of[p + 1], (staff(s), day(p)))
+        staff_day = lambda s, p: (week_of[p], (staff(s), day(p)))
+        staff_week = lambda s, w: (w, staff(s))
+        coverage = lambda p: (week_of[p], day(p))
+        agency = lambda p, a: (week_of[p], (day(p), self.index["agencies"][a]))
+        locate = {
+            "DO-AM_shifts": pair,
+            "PH-AM_shifts": pair,
+            "3AM_shifts": lambda s, p: (week_of[p + 2], (staff(s), day(p + 1))),
+            "+AM_General_Cov": coverage,
+            "-AM_General_Cov": coverage,
+            "+PM_General_Cov": coverage,
+            "-PM_General_Cov": coverage,
+            "Morning_Agency_Cov": agency,
+            "Afternoon_Agency_Cov": agency,
+            "One_Shift_Per_Day": staff_day,
+            "One_DO_Per_Week": staff_week,
+            "PH_Shift": staff_day,
+            "Half_Day_Shift": staff_week,
+            "44_Hours": staff_week,
+        }
+        for code in SOFT_CODES + HARD_CODES:
+            values = rules[code]
+            if code in ("Morning_Agency_Cov", "Afternoon_Agency_Cov"):
+                #Day-major like the model
+                values = values.T
+            for cell in zip(*np.nonzero(values)):
+                w, label = locate[code](*cell)
+                yield code, self.weeks[w], label, float(values[cell])
+
+    def violations(self, x_val):
+        #Violations of one roster in the violations.json structure, per week
+        violations = {}
+        used = {}
+        for w in self.weeks:
+            violations[f'week_{w}'] = {code: [] for code in SOFT_CODES + HARD_CODES}
+            used[f'week_{w}'] = False
+        for code, w, label, value in self.cells(x_val):
+            violations[f'week_{w}'][code].append({"key": str(label), "slack": value})
+            if code in RELAXABLE_CODES:
+                used[f'week_{w}'] = True
+        violations["hard_slack_used"] = used
+        return violations
+
+    def slack_values(self, x_val):
+        #Violated cells of one roster in the slack_val format of the solver
+        slack_val = {code: {} for code in SOFT_CODES + HARD_CODES}
+        for code, w, label, value in self.cells(x_val):
+            slack_val[code][label] = {"value": value, "name": code}
+        return slack_val
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="scheduling_data.json")
+    parser.add_argument("--result", default="result/Q1/scheduling_result.json",
+                        help="roster to check")
+    parser.add_argument("--output", default=None,
+                        help="write the violations to this file (violations.json structure)")
+    parser.add_argument("--cross-week", action="store_true",
+                        help="also score DO-AM/PH-AM/3AM across week boundaries")
+    args = parser.parse_args()
+
+    scheduling_data = load_data(args.data)
+    with open(args.result, "r") as f:
+        x_val = load_roster(json.load(f), scheduling_data)
+
+    validator = RosterValidator(scheduling_data, cross_week=args.cross_week)
+    for code, total in validator.score(validator.to_array(x_val)).items():
+        print(f'{code:<22} {total:>6}')
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump(validator.violations(x_val), json_file, indent=4)
+        print("Successfully export violation results to json")